@@ -29,6 +29,8 @@ dateSelect.value = formattedDate;
 
 // Local wardrobe items cache
 let wardrobeItems = [];
+// Outfit suggestions currently on screen, by id
+let displayedOutfits = {};
 
 // Event Listeners
 uploadArea.addEventListener('click', () => fileInput.click());
@@ -85,7 +87,10 @@ async function handleFileUpload() {
             method: 'POST',
             body: formData
         });
-        const data = await response.json();
+        let data = await response.json();
+        if (response.status === 202) {
+            data = await waitForJob(data.status_url);
+        }
 
         if (data.status === 'success') {
             wardrobeItems.push(data.item);
@@ -111,13 +116,35 @@ async function handleFileUpload() {
     }
 }
 
+async function waitForJob(statusUrl) {
+    // Uploads queued in async mode are classified in the background
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const job = await (await fetch(`${BASE_URL}${statusUrl}`)).json();
+        if (job.status === 'done') {
+            return { status: 'success', ...job.result };
+        }
+        if (job.status === 'failed' || job.error) {
+            throw new Error(job.error || 'Upload job failed');
+        }
+        progressBar.style.width = `${Math.round(job.progress * 100)}%`;
+    }
+}
+
+// Downscaled renditions instead of the original upload; the browser picks
+// the smallest one that is sharp at the displayed width
+function imageAttrs(item, width) {
+    const url = item.image_url;
+    return `src="${url}?size=small" srcset="${url}?size=thumb 160w, ${url}?size=small 320w" sizes="${width}px" loading="lazy"`;
+}
+
 function displayWardrobeItems(filtered = wardrobeItems) {
     wardrobeGrid.innerHTML = '';
     filtered.forEach(item => {
         const itemElement = document.createElement('div');
         itemElement.className = 'clothing-item';
         itemElement.innerHTML = `
-            <img src="${item.image_url}" alt="${item.name}">
+            <img ${imageAttrs(item, 200)} alt="${item.name}">
             <div class="item-actions">
                 <button onclick="editItem('${item.id}')"><i class="fas fa-edit"></i></button>
                 <button onclick="deleteItem('${item.id}')"><i class="fas fa-trash"></i></button>
@@ -192,6 +219,7 @@ async function getOutfitSuggestions() {
     const occasion = occasionSelect.value;
     const date = dateSelect.value;
     outfitsContainer.innerHTML = '';
+    displayedOutfits = {};
 
     try {
         const response = await fetch(`${BASE_URL}/api/outfits/${USER_ID}?occasion=${occasion}&date=${date}&count=3`);
@@ -211,12 +239,13 @@ async function getOutfitSuggestions() {
 }
 
 function displayOutfit(outfit, number) {
+    displayedOutfits[outfit.id] = outfit;
     const outfitElement = document.createElement('div');
     outfitElement.className = 'outfit-card';
 
     let itemsHTML = '';
     outfit.items.forEach(item => {
-        itemsHTML += `<img src="${item.image_url}" class="outfit-item" alt="${item.name}">`;
+        itemsHTML += `<img ${imageAttrs(item, 120)} class="outfit-item" alt="${item.name}">`;
     });
 
     outfitElement.innerHTML = `
@@ -234,11 +263,14 @@ function displayOutfit(outfit, number) {
 
 window.saveOutfit = async function(outfitId) {
     try {
-        const outfit = (await (await fetch(`${BASE_URL}/api/outfits/${USER_ID}?occasion=${occasionSelect.value}&date=${dateSelect.value}`)).json()).outfits.find(o => o.id === outfitId);
+        // The server keeps generated suggestions, so the id is enough; the
+        // items are only used if the suggestion has expired
+        const outfit = displayedOutfits[outfitId];
         const response = await fetch(`${BASE_URL}/api/outfits/${USER_ID}`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
+                outfit_id: outfitId,
                 items: outfit.items.map(item => item.id),
                 occasion: outfit.occasion,
                 name: `Outfit ${outfitsContainer.children.length + 1}`
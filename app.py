@@ -1,27 +1,43 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, send_file, g
 from flask_cors import CORS
 import os
+import sys
 import uuid
 from datetime import datetime
 import numpy as np
-import json
+import hashlib
+import time
+import zlib
 from werkzeug.utils import secure_filename
 import logging
 import random
-import tensorflow as tf
-from tensorflow.keras.applications import ResNet50
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.resnet50 import preprocess_input
-import cv2
-import requests
-from model import ChatbotModel  # Import the new chatbot model
+from concurrent.futures import ThreadPoolExecutor
+from inference import BatchInferenceEngine, warm_up
+from inference_server import InferenceClient
+from model_loader import LazyModel
+from embedding_store import EmbeddingStore
+from storage import create_storage
+from colors import ColorExtractor
+from image_pipeline import ImagePipeline, perceptual_hash
+from embedding_backends import create_backend
+from content_store import ClassificationCache, UploadStore, content_hash
+from renditions import RenditionStore, RENDITION_SIZES, FORMATS
+from weather import WeatherClient
+from jobs import JobQueue, QueueFullError
+from wardrobe_index import WardrobeIndex
+from outfit_engine import OutfitEngine, OCCASION_CATEGORIES, DEFAULT_CATEGORIES
+from outfit_cache import OutfitCache
+import organizer
+import metrics
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging; every line carries the id of the request that produced it
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s')
+for handler in logging.getLogger().handlers:
+    handler.addFilter(metrics.TraceIdFilter())
 logger = logging.getLogger(__name__)
 
 # Configuration
@@ -29,6 +45,36 @@ UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 DATABASE_PATH = 'database'
 WEATHER_API_KEY = "your_weather_api_key"  # Replace with your actual API key
+WEATHER_API_URL = os.environ.get('WEATHER_API_URL', 'http://api.weatherapi.com/v1')
+WEATHER_CACHE_TTL = int(os.environ.get('WEATHER_CACHE_TTL', 1800))
+WEATHER_ERROR_TTL = int(os.environ.get('WEATHER_ERROR_TTL', 60))
+WEATHER_FALLBACK = {"temp": 70, "conditions": "unknown", "recommendation": "versatile clothing"}
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')  # 'json' or 'sqlite'
+CHAT_HISTORY_LIMIT = int(os.environ.get('CHAT_HISTORY_LIMIT', 100)) or None  # messages kept per user; 0 = keep everything
+CHAT_PAGE_LIMIT = 200  # max messages per /api/chat/<user_id>/history page
+WARDROBE_PAGE_LIMIT = 500  # max items per /api/wardrobe/<user_id>?limit= page
+CHAT_BATCH_LIMIT = 1000
+ASYNC_UPLOADS = os.environ.get('ASYNC_UPLOADS', '0') == '1'  # per request: /api/upload/<id>?async=1|0
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 2))
+UPLOAD_QUEUE_SIZE = int(os.environ.get('UPLOAD_QUEUE_SIZE', 32))
+OUTFIT_CACHE_TTL = int(os.environ.get('OUTFIT_CACHE_TTL', 900))
+COLOR_ANALYSIS_MAX_SIDE = int(os.environ.get('COLOR_ANALYSIS_MAX_SIDE', 64))
+COLOR_PALETTE_SIZE = int(os.environ.get('COLOR_PALETTE_SIZE', 1))  # >1 stores a ranked palette per item
+EMBEDDING_MAX_BATCH_SIZE = int(os.environ.get('EMBEDDING_MAX_BATCH_SIZE', 16))
+EMBEDDING_MAX_WAIT_MS = float(os.environ.get('EMBEDDING_MAX_WAIT_MS', 10))
+IMAGE_MODEL_WEIGHTS = os.environ.get('IMAGE_MODEL_WEIGHTS', 'imagenet')  # or a local .h5 path; 'none' = random (benchmarks)
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'resnet50')  # resnet50, mobilenet_v2 or tflite_int8
+TFLITE_BASE = os.environ.get('TFLITE_BASE', 'resnet50')  # network quantised for tflite_int8
+TFLITE_MODEL_PATH = os.environ.get('TFLITE_MODEL_PATH')  # default database/models/<base>-int8.tflite, converted on first load
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', '1') == '1'  # load and warm models in the background at startup
+INFERENCE_SOCKET = os.environ.get('INFERENCE_SOCKET')  # Unix socket of inference_server.py, shared by all workers
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '0') == '1'  # allows ?profile=1 to sample a request's stacks
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+CLASSIFICATION_CACHE_MB = int(os.environ.get('CLASSIFICATION_CACHE_MB', 256))
+NEAR_DUPLICATE_DISTANCE = int(os.environ.get('NEAR_DUPLICATE_DISTANCE', 0))  # max differing perceptual-hash bits; 0 = exact matches only
+RENDITION_QUALITY = int(os.environ.get('RENDITION_QUALITY', 80))
+RENDITION_PREGENERATE = [size for size in os.environ.get('RENDITION_PREGENERATE', 'thumb,small').split(',') if size]  # made right after upload
+IMAGE_MAX_AGE = 365 * 24 * 3600  # image URLs never change content, so clients may cache them for good
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
@@ -39,238 +85,361 @@ os.makedirs(DATABASE_PATH, exist_ok=True)
 os.makedirs(os.path.join(DATABASE_PATH, 'users'), exist_ok=True)
 os.makedirs(os.path.join(DATABASE_PATH, 'outfits'), exist_ok=True)
 
-# Load AI Models
-try:
-    image_model = ResNet50(weights='imagenet', include_top=False, pooling='avg')
-    chatbot_model = ChatbotModel()  # Initialize our custom chatbot model
-    models_loaded = True
-    logger.info("AI models loaded successfully")
-except Exception as e:
-    models_loaded = False
-    logger.error(f"Error loading AI models: {e}")
+storage = metrics.Instrumented(create_storage(STORAGE_BACKEND, DATABASE_PATH), "storage")
+embedding_backend = create_backend(
+    EMBEDDING_BACKEND, IMAGE_MODEL_WEIGHTS,
+    tflite_path=TFLITE_MODEL_PATH or os.path.join(DATABASE_PATH, 'models', f"{TFLITE_BASE}-int8.tflite"),
+    tflite_base=TFLITE_BASE
+)
+# Vectors from different backends can't be compared, so each keeps its own store
+embedding_store = EmbeddingStore(os.path.join(DATABASE_PATH, 'embeddings' if embedding_backend.name == 'resnet50'
+                                              else f"embeddings-{embedding_backend.name.replace(':', '-')}"))
+color_extractor = ColorExtractor(max_side=COLOR_ANALYSIS_MAX_SIDE)
+image_pipeline = ImagePipeline(model_size=embedding_backend.input_size)
+upload_store = UploadStore(UPLOAD_FOLDER)
+rendition_store = RenditionStore(UPLOAD_FOLDER, quality=RENDITION_QUALITY)
+classification_cache = ClassificationCache(
+    os.path.join(DATABASE_PATH, 'classifications'),
+    namespace=f"{embedding_backend.name}:{IMAGE_MODEL_WEIGHTS}:colors:{COLOR_ANALYSIS_MAX_SIDE}:{COLOR_PALETTE_SIZE}",
+    max_bytes=CLASSIFICATION_CACHE_MB * 1024 * 1024,
+    max_distance=NEAR_DUPLICATE_DISTANCE
+)
+# Writes uploaded originals to disk while they are being classified
+file_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upload-writer")
+weather_client = WeatherClient(WEATHER_API_KEY, base_url=WEATHER_API_URL, ttl=WEATHER_CACHE_TTL,
+                               fallback=WEATHER_FALLBACK, error_ttl=WEATHER_ERROR_TTL)
+wardrobe_index = WardrobeIndex(storage.list_items_keyed, storage.wardrobe_version)
+outfit_engine = OutfitEngine()
+outfit_cache = OutfitCache(ttl=OUTFIT_CACHE_TTL)
+upload_jobs = JobQueue(workers=UPLOAD_WORKERS, max_pending=UPLOAD_QUEUE_SIZE, name="upload",
+                       root=os.path.join(DATABASE_PATH, 'jobs'))
+
+# AI Models
+# TensorFlow and sklearn are imported inside the loaders so importing this
+# module (worker start, tests) stays fast; until the embedding backend is
+# ready uploads fall back to the filename heuristic
+def load_image_model():
+    return embedding_backend.load()
+
+def warm_up_image_model(backend):
+    warm_up(backend, backend.input_shape)
+
+def load_chatbot_model():
+    from model import ChatbotModel
+    # The chatbot calls back into this module's helpers (defined below)
+    return ChatbotModel(actions=sys.modules[__name__])
+
+image_model = LazyModel("image_model", load_image_model, warmup=warm_up_image_model)
+chatbot_model = LazyModel("chatbot_model", load_chatbot_model)
+# With a shared inference server workers don't hold their own model; it is
+# only loaded here if the server can't be reached
+inference_client = InferenceClient(INFERENCE_SOCKET, backend=embedding_backend.name) if INFERENCE_SOCKET else None
+if MODEL_WARMUP:
+    if inference_client is None:
+        image_model.load_in_background()
+    chatbot_model.load_in_background()
+
+# Concurrent uploads share model calls instead of paying per-image overhead
+def predict_batch(batch):
+    with metrics.stage("predict"):
+        return image_model.get().predict_on_batch(batch)
+
+embedding_engine = BatchInferenceEngine(
+    predict_batch,
+    max_batch_size=EMBEDDING_MAX_BATCH_SIZE,
+    max_wait_ms=EMBEDDING_MAX_WAIT_MS
+)
+
+def image_model_available():
+    if inference_client is not None and inference_client.available():
+        return True
+    return image_model.get(wait=False) is not None
+
+@metrics.timed("embedding")
+def embed_preprocessed(x):
+    if inference_client is not None:
+        try:
+            return inference_client.embed(x)
+        except OSError as e:
+            logger.warning(f"Inference server unavailable, using in-process model: {e}")
+    return embedding_engine.submit(x)
 
 # Helper Functions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_user_data_path(user_id):
-    return os.path.join(DATABASE_PATH, 'users', f"{user_id}.json")
-
-def load_user_data(user_id):
-    user_path = get_user_data_path(user_id)
-    if os.path.exists(user_path):
-        with open(user_path, 'r') as f:
-            return json.load(f)
-    return {
-        "id": user_id,
-        "wardrobe": [],
-        "outfits": [],
-        "preferences": {"style_preferences": [], "color_preferences": [], "favorite_occasions": []},
-        "chatbot_history": [],
-        "organization": {"closet_sections": [], "last_organized": None}
-    }
-
-def save_user_data(user_id, data):
-    with open(get_user_data_path(user_id), 'w') as f:
-        json.dump(data, f)
-
-def generate_image_embedding(img_path):
+def item_fields_error(fields):
+    # Organizing and outfit descriptions rely on these being non-empty
+    for field in ("name", "category"):
+        if field in fields and (not isinstance(fields[field], str) or not fields[field]):
+            return f"{field} must be a non-empty string"
+    for field in ("colors", "seasons", "occasions"):
+        value = fields.get(field)
+        if field in fields and (not isinstance(value, list) or not value or not all(isinstance(v, str) for v in value)):
+            return f"{field} must be a non-empty list of strings"
+    if "tags" in fields and not isinstance(fields["tags"], list):
+        return "tags must be a list"
+    return None
+
+def generate_image_embedding(rgb):
     try:
-        img = image.load_img(img_path, target_size=(224, 224))
-        x = image.img_to_array(img)
-        x = np.expand_dims(x, axis=0)
-        x = preprocess_input(x)
-        features = image_model.predict(x)
-        return features.flatten().tolist()
+        x = embedding_backend.preprocess(image_pipeline.model_input(rgb))
+        features = embed_preprocessed(x)
+        return np.asarray(features).flatten().tolist()
     except Exception as e:
         logger.error(f"Error generating image embedding: {e}")
         return []
 
-def get_colors(img_path):
-    img = cv2.imread(img_path)
-    if img is None:
-        return ["unknown"]
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    pixels = img.reshape(-1, 3)
-    pixels = np.float32(pixels)
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
-    k = 3
-    _, labels, palette = cv2.kmeans(pixels, k, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-    counts = np.bincount(labels.flatten())
-    dominant_color = palette[np.argmax(counts)]
-    r, g, b = dominant_color
-    color_map = {
-        "red": (r > 150 and g < 100 and b < 100),
-        "green": (r < 100 and g > 150 and b < 100),
-        "blue": (r < 100 and g < 100 and b > 150),
-        "yellow": (r > 150 and g > 150 and b < 100),
-        "purple": (r > 100 and g < 100 and b > 100),
-        "orange": (r > 150 and g > 100 and b < 100),
-        "pink": (r > 150 and g < 100 and b > 100),
-        "black": (r < 50 and g < 50 and b < 50),
-        "white": (r > 200 and g > 200 and b > 200),
-        "gray": (r > 50 and r < 200 and g > 50 and g < 200 and b > 50 and b < 200 and max(r, g, b) - min(r, g, b) < 50)
-    }
-    for color_name, condition in color_map.items():
-        if condition:
-            return [color_name]
-    return ["other"]
-
-def classify_clothing(img_path, filename):
-    if not models_loaded:
-        categories = ['tops', 'bottoms', 'dresses', 'outerwear', 'shoes', 'accessories']
-        seasons = ['spring', 'summer', 'fall', 'winter']
-        occasions = ['casual', 'work', 'formal', 'athletic']
-        name = filename.lower()
-        if any(word in name for word in ['shirt', 'top', 'tee', 'blouse', 'sweater']):
-            category = 'tops'
-        elif any(word in name for word in ['pants', 'jeans', 'shorts', 'skirt']):
-            category = 'bottoms'
-        elif any(word in name for word in ['dress', 'gown']):
-            category = 'dresses'
-        elif any(word in name for word in ['jacket', 'coat', 'hoodie']):
-            category = 'outerwear'
-        elif any(word in name for word in ['shoe', 'sneaker', 'boot']):
-            category = 'shoes'
-        elif any(word in name for word in ['hat', 'scarf', 'glove', 'necklace', 'earring']):
-            category = 'accessories'
-        else:
-            category = random.choice(categories)
-        selected_seasons = random.sample(seasons, k=random.randint(1, 4))
-        selected_occasions = random.sample(occasions, k=random.randint(1, 3))
-        return {
-            "category": category,
-            "seasons": selected_seasons,
-            "occasions": selected_occasions,
-            "colors": get_colors(img_path) if models_loaded else [random.choice(['black', 'white', 'blue', 'red', 'green', 'yellow', 'other'])],
-            "tags": []
-        }
+@metrics.timed("colors")
+def get_colors(rgb):
+    return color_extractor.extract(rgb, top=COLOR_PALETTE_SIZE)
+
+def classify_by_filename(filename):
+    categories = ['tops', 'bottoms', 'dresses', 'outerwear', 'shoes', 'accessories']
+    seasons = ['spring', 'summer', 'fall', 'winter']
+    occasions = ['casual', 'work', 'formal', 'athletic']
+    name = filename.lower()
+    if any(word in name for word in ['shirt', 'top', 'tee', 'blouse', 'sweater']):
+        category = 'tops'
+    elif any(word in name for word in ['pants', 'jeans', 'shorts', 'skirt']):
+        category = 'bottoms'
+    elif any(word in name for word in ['dress', 'gown']):
+        category = 'dresses'
+    elif any(word in name for word in ['jacket', 'coat', 'hoodie']):
+        category = 'outerwear'
+    elif any(word in name for word in ['shoe', 'sneaker', 'boot']):
+        category = 'shoes'
+    elif any(word in name for word in ['hat', 'scarf', 'glove', 'necklace', 'earring']):
+        category = 'accessories'
     else:
-        embedding = generate_image_embedding(img_path)
-        colors = get_colors(img_path)
-        result = classify_clothing(img_path, filename)  # Recursive call for fallback
-        result["embedding"] = embedding
-        result["colors"] = colors
-        return result
+        category = random.choice(categories)
+    selected_seasons = random.sample(seasons, k=random.randint(1, 4))
+    selected_occasions = random.sample(occasions, k=random.randint(1, 3))
+    return {
+        "category": category,
+        "seasons": selected_seasons,
+        "occasions": selected_occasions,
+        "colors": [random.choice(['black', 'white', 'blue', 'red', 'green', 'yellow', 'other'])],
+        "tags": []
+    }
 
+def classify_image(data, digest):
+    # Colours and embedding for an upload, from the cache when the same
+    # (or, with NEAR_DUPLICATE_DISTANCE, a near-identical) image was seen
+    cached = classification_cache.get(digest)
+    if cached is not None:
+        return cached
+    if not image_model_available():
+        return None
+    # One decode feeds both the embedding and the colour analysis
+    with metrics.stage("decode"):
+        rgb = image_pipeline.decode(data)
+    if rgb is None:
+        return None
+    phash = perceptual_hash(rgb) if NEAR_DUPLICATE_DISTANCE > 0 else None
+    if phash is not None:
+        cached = classification_cache.get_near(phash)
+        if cached is not None:
+            classification_cache.set(digest, cached, phash)
+            return cached
+    result = {"embedding": generate_image_embedding(rgb), "colors": get_colors(rgb)}
+    if result["embedding"]:
+        classification_cache.set(digest, result, phash)
+    return result
+
+def classify_clothing(data, filename, digest=None):
+    result = classify_by_filename(filename)
+    image_result = classify_image(data, digest or content_hash(data))
+    if image_result is not None:
+        result.update(image_result)
+    return result
+
+@metrics.timed("weather")
 def get_weather_forecast(location, date_str):
-    try:
-        url = f"http://api.weatherapi.com/v1/forecast.json?key={WEATHER_API_KEY}&q={location}&dt={date_str}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            forecast = data['forecast']['forecastday'][0]['day']
-            return {
-                "temp": forecast['avgtemp_f'],
-                "conditions": forecast['condition']['text'].lower(),
-                "recommendation": "Adjust based on weather conditions."
-            }
+    # Failures are logged and answered with WEATHER_FALLBACK by the client
+    return weather_client.forecast(location, date_str)
+
+@metrics.timed("organize")
+def organize_wardrobe(user_id, rebuild=False):
+    # Sections are maintained incrementally as items change; a full pass only
+    # runs when asked for or when the stored state predates the current rules
+    def apply(organization):
+        if rebuild or not organizer.is_current(organization):
+            organization.update(organizer.build_organization(storage.list_items(user_id)))
+        if not organizer.is_empty(organization):
+            organization["last_organized"] = datetime.now().isoformat()
+
+    return organizer.render(storage.update_organization(user_id, apply))
+
+def wardrobe_changed(user_id, item=None, removed_id=None, stamp=False):
+    # Brings every derived view of the wardrobe in line with one stored change
+    if removed_id is not None:
+        wardrobe_index.remove(user_id, removed_id)
+        embedding_store.remove(user_id, removed_id)
+    else:
+        wardrobe_index.put(user_id, item)
+    outfit_cache.invalidate_user(user_id)
+    return reorganize_item(user_id, item, removed_id, stamp)
+
+@metrics.timed("organize")
+def reorganize_item(user_id, item=None, removed_id=None, stamp=False):
+    def apply(organization):
+        if not organizer.is_current(organization):
+            organization.update(organizer.build_organization(storage.list_items(user_id)))
+        elif removed_id is not None:
+            organizer.remove_item(organization, removed_id)
         else:
-            logger.error(f"Weather API error: {response.status_code}")
-            return {"temp": 70, "conditions": "unknown", "recommendation": "versatile clothing"}
-    except Exception as e:
-        logger.error(f"Error getting weather forecast: {e}")
-        return {"temp": 70, "conditions": "unknown", "recommendation": "versatile clothing"}
-
-def organize_wardrobe(user_id):
-    user_data = load_user_data(user_id)
-    wardrobe = user_data["wardrobe"]
-    if not wardrobe:
-        return {"message": "Wardrobe is empty", "sections": []}
-
-    sections = {
-        "Daily Wear": {"categories": ["tops", "bottoms"], "seasons": ["spring", "summer"], "items": []},
-        "Seasonal": {"categories": ["outerwear"], "seasons": ["fall", "winter"], "items": []},
-        "Special Occasion": {"categories": ["dresses"], "seasons": ["all"], "items": []},
-        "Accessories": {"categories": ["accessories", "shoes"], "seasons": ["all"], "items": []}
-    }
+            organizer.place(organization, item)
+        if stamp and not organizer.is_empty(organization):
+            organization["last_organized"] = datetime.now().isoformat()
 
-    for item in wardrobe:
-        placed = False
-        for section_name, section in sections.items():
-            if item["category"] in section["categories"]:
-                if "all" in section["seasons"] or any(s in item["seasons"] for s in section["seasons"]):
-                    section["items"].append({
-                        "id": item["id"],
-                        "name": item["name"],
-                        "category": item["category"],
-                        "color": item["colors"][0],
-                        "placement": f"{section_name} Section"
-                    })
-                    placed = True
-                    break
-        if not placed:
-            sections["Daily Wear"]["items"].append({
-                "id": item["id"],
-                "name": item["name"],
-                "category": item["category"],
-                "color": item["colors"][0],
-                "placement": "Daily Wear Section (default)"
-            })
-
-    user_data["organization"]["closet_sections"] = [
-        {"name": name, "items": data["items"]} for name, data in sections.items()
-    ]
-    user_data["organization"]["last_organized"] = datetime.now().isoformat()
-    save_user_data(user_id, user_data)
-
-    organization_message = "I've organized your wardrobe! Here's where your clothes should go:\n"
-    for section_name, section in sections.items():
-        if section["items"]:
-            item_names = ", ".join([item["name"] for item in section["items"]])
-            organization_message += f"- {section_name}: {item_names}\n"
-    return {"message": organization_message, "sections": user_data["organization"]["closet_sections"]}
+    return organizer.render(storage.update_organization(user_id, apply))
 
 def generate_outfit_suggestions(user_id, occasion, date_str, num_outfits=3):
-    user_data = load_user_data(user_id)
-    if not user_data["wardrobe"]:
+    # Read the version first: a concurrent write can only make the cached
+    # result newer than its key, never older
+    version = wardrobe_index.version(user_id)
+    wardrobe = wardrobe_index.items(user_id)
+    if not wardrobe:
         return []
 
     weather = get_weather_forecast("user_location", date_str)
-    occasion_items = [item for item in user_data["wardrobe"] if occasion in item["occasions"]]
-    if len(occasion_items) < 4:
-        occasion_items = user_data["wardrobe"]
+    key = (user_id, version, occasion, date_str, weather["temp"], weather["conditions"], num_outfits)
+    return outfit_cache.get_or_generate(
+        key, lambda: build_outfit_suggestions(user_id, version, wardrobe, occasion, date_str, weather, num_outfits)
+    )
 
+@metrics.timed("outfit_generation")
+def build_outfit_suggestions(user_id, version, wardrobe, occasion, date_str, weather, num_outfits):
     seasons = ["spring", "summer"] if weather["temp"] > 65 else ["fall", "winter"]
-    season_items = [item for item in occasion_items if any(season in item["seasons"] for season in seasons)]
-    items_pool = season_items if len(season_items) >= 4 else occasion_items
-
-    categories = {
-        "casual": ["tops", "bottoms", "shoes"],
-        "work": ["tops", "bottoms", "shoes"],
-        "formal": ["dresses", "shoes", "accessories"],
-        "athletic": ["tops", "bottoms", "shoes"]
-    }
-    target_cats = categories.get(occasion, ["tops", "bottoms", "shoes"])
-
+    target_cats = OCCASION_CATEGORIES.get(occasion, DEFAULT_CATEGORIES)
+
+    prepared = outfit_engine.prepare(
+        wardrobe, target_cats,
+        embedding_lookup=embedding_store.lookup(user_id),
+        cache_key=(user_id, version)
+    )
+    seed = zlib.crc32(f"{user_id}|{occasion}|{date_str}".encode())
+    count = min(num_outfits, len(wardrobe) // len(target_cats))
     outfits = []
-    for _ in range(min(num_outfits, len(items_pool) // len(target_cats))):
-        outfit = {"id": str(uuid.uuid4()), "occasion": occasion, "date": date_str, "weather": weather, "items": []}
-        for category in target_cats:
-            cat_items = [item for item in items_pool if item["category"] == category]
-            if cat_items:
-                chosen_item = random.choice(cat_items)
-                outfit["items"].append(chosen_item)
-                items_pool.remove(chosen_item)
-        outfit["score"] = len(outfit["items"]) / len(target_cats)
-        colors = ", ".join(set([item["colors"][0] for item in outfit["items"]]))
-        outfit["description"] = f"{occasion.capitalize()} outfit for {weather['conditions']} weather ({weather['temp']}°F) with {colors} pieces."
-        outfits.append(outfit)
-
-    outfits.sort(key=lambda x: x["score"], reverse=True)
+    for score, items in outfit_engine.suggest(prepared, target_cats, occasion, seasons, count, seed):
+        colors = ", ".join(dict.fromkeys(item["colors"][0] if item["colors"] else "unknown" for item in items))
+        # Same items for the same day and occasion always get the same id
+        outfit_key = "|".join([user_id, occasion, date_str] + [item["id"] for item in items])
+        outfits.append({
+            "id": str(uuid.uuid5(uuid.NAMESPACE_URL, outfit_key)),
+            "occasion": occasion,
+            "date": date_str,
+            "weather": weather,
+            "items": items,
+            "score": score,
+            "description": f"{occasion.capitalize()} outfit for {weather['conditions']} weather ({weather['temp']}°F) with {colors} pieces."
+        })
     return outfits
 
+def ingest_upload(user_id, filepath, filename, unique_filename, data=None, progress=None):
+    # With data the original is written concurrently with classification;
+    # without it the upload was persisted already and is read back once
+    progress = progress or (lambda stage, fraction=None: None)
+    persisted = data is None
+    if persisted:
+        with open(filepath, 'rb') as f:
+            data = f.read()
+    digest = content_hash(data)
+    saved = None if persisted else file_writer.submit(upload_store.save, filepath, data, digest)
+    progress("classifying", 0.1)
+    classification = classify_clothing(data, filename, digest)
+    if saved is not None:
+        saved.result()
+    file_writer.submit(rendition_store.generate, unique_filename, RENDITION_PREGENERATE)
+    item_id = str(uuid.uuid4())
+
+    new_item = {
+        "id": item_id,
+        "name": os.path.splitext(filename)[0],
+        "filepath": filepath,
+        "content_hash": digest,
+        "image_url": f"/api/image/{unique_filename}",
+        "upload_date": datetime.now().isoformat(),
+        "category": classification["category"],
+        "colors": classification["colors"],
+        "seasons": classification["seasons"],
+        "occasions": classification["occasions"],
+        "tags": classification["tags"]
+    }
+    progress("saving", 0.7)
+    storage.add_item(user_id, new_item)
+    if classification.get("embedding"):
+        embedding_store.add(user_id, item_id, classification["embedding"])
+
+    progress("organizing", 0.85)
+    org_result = wardrobe_changed(user_id, new_item, stamp=True)
+    return {"item": new_item, "organization": org_result}
+
 def process_chatbot_query(user_id, query):
-    user_data = load_user_data(user_id)
-    user_data["chatbot_history"].append({"sender": "user", "message": query, "timestamp": datetime.now().isoformat()})
+    user_entry = {"sender": "user", "message": query, "timestamp": datetime.now().isoformat()}
 
     # Use the chatbot model to predict intent and generate response
-    response = chatbot_model.generate_response(query, user_data)
+    response = chatbot_model.get().generate_response(query, {"id": user_id})
+
+    assistant_entry = {"sender": "assistant", "message": response, "timestamp": datetime.now().isoformat()}
+    storage.append_chat(user_id, [user_entry, assistant_entry], limit=CHAT_HISTORY_LIMIT)
+    return response
+
+@metrics.registry.collector
+def collect_runtime_metrics():
+    caches = {
+        "weather": weather_client.stats(),
+        "outfit_suggestions": outfit_cache.stats()["suggestions"],
+        "classifications": classification_cache.stats()
+    }
+    model = chatbot_model.get(wait=False) if chatbot_model.ready else None
+    if model is not None:
+        info = model._cached_intent.cache_info()
+        caches["chat_intents"] = {"hits": info.hits, "misses": info.misses, "evictions": 0, "size": info.currsize}
+    engine = embedding_engine.stats
+    return [
+        ("stylestack_cache_hits_total", "counter", "Cache hits",
+         [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        ("stylestack_cache_misses_total", "counter", "Cache misses",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        ("stylestack_cache_evictions_total", "counter", "Cache evictions",
+         [({"cache": name}, stats.get("evictions", 0)) for name, stats in caches.items()]),
+        ("stylestack_cache_entries", "gauge", "Entries currently cached",
+         [({"cache": name}, stats.get("size", stats.get("entries", 0))) for name, stats in caches.items()]),
+        ("stylestack_queue_depth", "gauge", "Work waiting in in-process queues",
+         [({"queue": "upload_jobs"}, upload_jobs.pending()), ({"queue": "embeddings"}, embedding_engine.queue_depth())]),
+        ("stylestack_upload_jobs_running", "gauge", "Upload jobs being processed", [({}, upload_jobs.stats()["running"])]),
+        ("stylestack_embedding_batches_total", "counter", "Model calls made by the batching engine", [({}, engine["batches"])]),
+        ("stylestack_embedding_items_total", "counter", "Images embedded by the batching engine", [({}, engine["items"])]),
+        ("stylestack_model_ready", "gauge", "1 once a model is loaded",
+         [({"model": lazy.name}, int(lazy.ready)) for lazy in (image_model, chatbot_model)]),
+    ]
 
-    user_data["chatbot_history"].append({"sender": "assistant", "message": response, "timestamp": datetime.now().isoformat()})
-    if len(user_data["chatbot_history"]) > 100:
-        user_data["chatbot_history"] = user_data["chatbot_history"][-100:]
-    save_user_data(user_id, user_data)
+@app.before_request
+def start_request():
+    g.request_start = time.perf_counter()
+    metrics.trace_id.set(metrics.accept_trace_id(request.headers.get('X-Request-ID')))
+    if PROFILE_REQUESTS and request.args.get('profile') == '1':
+        g.profile_id = metrics.new_trace_id()
+        g.profiler = metrics.SamplingProfiler(interval=PROFILE_INTERVAL_MS / 1000).start()
+
+@app.after_request
+def finish_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.request_seconds.observe(time.perf_counter() - g.request_start, request.method, route,
+                                    str(response.status_code))
+    response.headers['X-Request-ID'] = metrics.trace_id.get()
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        # Collapsed stacks, ready for flamegraph.pl or speedscope; the file
+        # name is generated here, never taken from the request
+        path = os.path.join(DATABASE_PATH, 'profiles', f"{g.profile_id}.folded")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(profiler.stop().report())
+        logger.info(f"Profile of {request.method} {request.path}: {sum(profiler.samples.values())} samples in {path}")
+        response.headers['X-Profile'] = path
     return response
 
 # API Routes
@@ -282,20 +451,68 @@ def serve_frontend():
 def serve_static(path):
     return send_from_directory('static', path)
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    models = {"image_model": dict(image_model.status(), backend=embedding_backend.name),
+              "chatbot_model": chatbot_model.status()}
+    image_ready = image_model.ready
+    if inference_client is not None:
+        models["inference_server"] = {"socket": INFERENCE_SOCKET, "available": inference_client.available()}
+        image_ready = image_ready or models["inference_server"]["available"]
+    ready = image_ready and chatbot_model.ready
+    return jsonify({"ready": ready, "models": models}), 200 if ready else 503
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    return jsonify({"weather": weather_client.stats(), "outfits": outfit_cache.stats(),
+                    "classifications": classification_cache.stats(), "uploads": upload_store.stats()})
+
 @app.route('/api/organize/<user_id>', methods=['GET'])
 def organize_wardrobe_route(user_id):
-    result = organize_wardrobe(user_id)
+    result = organize_wardrobe(user_id, rebuild=request.args.get('rebuild') == '1')
     return jsonify(result)
 
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    data = request.json or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return jsonify({"error": "Expected a list of query strings"}), 400
+    if len(queries) > CHAT_BATCH_LIMIT:
+        return jsonify({"error": f"At most {CHAT_BATCH_LIMIT} queries per batch"}), 400
+    model = chatbot_model.get()
+    if model is None:
+        return jsonify({"error": "Chatbot model unavailable"}), 503
+    intents = model.predict_intents(queries)
+    return jsonify({"intents": intents, "count": len(intents)})
+
 @app.route('/api/chat/<user_id>', methods=['POST'])
 def chat(user_id):
     data = request.json
     query = data.get("query", "")
     if not query:
         return jsonify({"error": "No query provided"}), 400
+    if chatbot_model.get() is None:
+        return jsonify({"error": "Chatbot model unavailable"}), 503
     response = process_chatbot_query(user_id, query)
     return jsonify({"response": response})
 
+@app.route('/api/chat/<user_id>/history')
+def chat_history(user_id):
+    # Newest page first; pass next_before back as ?before= for older messages
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), CHAT_PAGE_LIMIT))
+    messages, next_before = storage.chat_history(user_id, before, limit)
+    return jsonify({"messages": messages, "count": len(messages), "next_before": next_before})
+
 @app.route('/api/upload/<user_id>', methods=['POST'])
 def upload_file(user_id):
     if 'file' not in request.files:
@@ -307,82 +524,156 @@ def upload_file(user_id):
     filename = secure_filename(file.filename)
     unique_filename = f"{os.path.splitext(filename)[0]}_{uuid.uuid4().hex}{os.path.splitext(filename)[1]}"
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    file.save(filepath)
 
-    classification = classify_clothing(filepath, filename)
-    user_data = load_user_data(user_id)
-    item_id = str(uuid.uuid4())
-
-    new_item = {
-        "id": item_id,
-        "name": os.path.splitext(filename)[0],
-        "filepath": filepath,
-        "image_url": f"/api/image/{unique_filename}",
-        "upload_date": datetime.now().isoformat(),
-        "category": classification["category"],
-        "colors": classification["colors"],
-        "seasons": classification["seasons"],
-        "occasions": classification["occasions"],
-        "tags": classification["tags"]
-    }
-    user_data["wardrobe"].append(new_item)
-    save_user_data(user_id, user_data)
-
-    org_result = organize_wardrobe(user_id)
-    return jsonify({"status": "success", "message": "File uploaded and wardrobe organized", "item": new_item, "organization": org_result})
+    if request.args.get('async', '1' if ASYNC_UPLOADS else '0') == '1':
+        # Queued uploads wait on disk rather than in memory
+        digest = upload_store.save(filepath, file.read())
+        try:
+            job = upload_jobs.submit(
+                lambda progress: ingest_upload(user_id, filepath, filename, unique_filename, progress=progress)
+            )
+        except QueueFullError as e:
+            upload_store.release(filepath, digest)
+            response = jsonify({"error": str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        response = jsonify({"status": "accepted", "job_id": job["id"], "status_url": f"/api/jobs/{job['id']}"})
+        response.headers['Location'] = f"/api/jobs/{job['id']}"
+        return response, 202
+
+    result = ingest_upload(user_id, filepath, filename, unique_filename, data=file.read())
+    return jsonify({"status": "success", "message": "File uploaded and wardrobe organized", **result})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 @app.route('/api/image/<filename>')
 def get_image(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # ?size=thumb|small|medium|large serves a downscaled WebP (or JPEG, by
+    # Accept header or ?format=) copy; no size serves the original
+    if filename.startswith('.') or filename != secure_filename(filename):
+        return jsonify({"error": "Image not found"}), 404
+    size = request.args.get('size', 'original')
+    negotiated = False
+    if size == 'original':
+        path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        if not os.path.isfile(path):
+            return jsonify({"error": "Image not found"}), 404
+        mimetype, etag = None, RenditionStore.etag(filename)
+    elif size in RENDITION_SIZES:
+        fmt = request.args.get('format')
+        if fmt is None:
+            negotiated = True
+            # Only an explicit image/webp counts; */* clients get JPEG
+            fmt = 'webp' if any(value == 'image/webp' for value, _ in request.accept_mimetypes) else 'jpeg'
+        if fmt not in FORMATS:
+            return jsonify({"error": f"Unknown format, expected one of {sorted(FORMATS)}"}), 400
+        path = rendition_store.get(filename, size, fmt)
+        if path is None:
+            return jsonify({"error": "Image not found"}), 404
+        mimetype, etag = FORMATS[fmt][0], RenditionStore.etag(filename, size, fmt)
+    else:
+        return jsonify({"error": f"Unknown size, expected original or one of {sorted(RENDITION_SIZES)}"}), 400
+
+    # send_file answers If-None-Match with 304 and Range with 206
+    response = send_file(os.path.abspath(path), mimetype=mimetype, etag=etag, max_age=IMAGE_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if negotiated:
+        response.vary.add('Accept')
+    return response
 
 @app.route('/api/wardrobe/<user_id>')
 def get_wardrobe(user_id):
-    user_data = load_user_data(user_id)
-    category = request.args.get('category', 'all')
-    color = request.args.get('color', 'all')
-    season = request.args.get('season', 'all')
-    occasion = request.args.get('occasion', 'all')
-
-    filtered_items = user_data["wardrobe"]
-    if category != 'all':
-        filtered_items = [item for item in filtered_items if item["category"] == category]
-    if color != 'all':
-        filtered_items = [item for item in filtered_items if color in item["colors"]]
-    if season != 'all':
-        filtered_items = [item for item in filtered_items if season in item["seasons"]]
-    if occasion != 'all':
-        filtered_items = [item for item in filtered_items if occasion in item["occasions"]]
-
-    return jsonify({"wardrobe": filtered_items, "total_items": len(user_data["wardrobe"]), "filtered_count": len(filtered_items)})
+    # The ETag covers the wardrobe version and the query, so an unchanged
+    # wardrobe is answered with 304 before any filtering or serialization
+    etag = f"{wardrobe_index.version(user_id)}-{hashlib.sha1(request.query_string).hexdigest()[:12]}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    filters = {}
+    for arg, field in (('category', 'category'), ('color', 'colors'), ('season', 'seasons'), ('occasion', 'occasions')):
+        value = request.args.get(arg, 'all')
+        if value != 'all':
+            filters[field] = value
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        if limit < 1:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+        limit = min(limit, WARDROBE_PAGE_LIMIT)
+    cursor = request.args.get('cursor', type=int)
+    result = wardrobe_index.query(user_id, filters, limit, cursor)
+
+    items = result["items"]
+    fields = request.args.get('fields')
+    if fields:
+        wanted = {"id", *fields.split(',')}
+        items = [{key: value for key, value in item.items() if key in wanted} for item in items]
+
+    response = jsonify({"wardrobe": items, "total_items": result["total"], "filtered_count": result["matched"],
+                        "next_cursor": result["next_cursor"]})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # browsers revalidate with If-None-Match
+    return response
 
 @app.route('/api/wardrobe/<user_id>/<item_id>', methods=['GET', 'PUT', 'DELETE'])
 def manage_wardrobe_item(user_id, item_id):
-    user_data = load_user_data(user_id)
-    item_index = next((i for i, item in enumerate(user_data["wardrobe"]) if item["id"] == item_id), None)
-    if item_index is None:
+    item = storage.get_item(user_id, item_id)
+    if item is None:
         return jsonify({"error": "Item not found"}), 404
 
     if request.method == 'GET':
-        return jsonify(user_data["wardrobe"][item_index])
+        return jsonify(item)
     elif request.method == 'PUT':
         data = request.json
+        if not isinstance(data, dict):
+            return jsonify({"error": "Expected a JSON object"}), 400
         allowed_fields = ["name", "category", "colors", "seasons", "occasions", "tags"]
-        for field in allowed_fields:
-            if field in data:
-                user_data["wardrobe"][item_index][field] = data[field]
-        save_user_data(user_id, user_data)
-        return jsonify({"status": "success", "message": "Item updated", "item": user_data["wardrobe"][item_index]})
+        fields = {field: data[field] for field in allowed_fields if field in data}
+        error = item_fields_error(fields)
+        if error:
+            return jsonify({"error": error}), 400
+        item = storage.update_item(user_id, item_id, fields)
+        if item is None:
+            return jsonify({"error": "Item not found"}), 404
+        wardrobe_changed(user_id, item)
+        return jsonify({"status": "success", "message": "Item updated", "item": item})
     elif request.method == 'DELETE':
-        item = user_data["wardrobe"][item_index]
-        if "filepath" in item and os.path.exists(item["filepath"]):
+        item = storage.delete_item(user_id, item_id)
+        if item is None:
+            return jsonify({"error": "Item not found"}), 404
+        # The image itself is only deleted once no other item refers to it
+        if "filepath" in item:
             try:
-                os.remove(item["filepath"])
+                upload_store.release(item["filepath"], item.get("content_hash"))
+                rendition_store.remove(os.path.basename(item["filepath"]))
             except Exception as e:
                 logger.warning(f"Could not delete file {item['filepath']}: {e}")
-        del user_data["wardrobe"][item_index]
-        save_user_data(user_id, user_data)
+        wardrobe_changed(user_id, removed_id=item_id)
         return jsonify({"status": "success", "message": "Item deleted"})
 
+@app.route('/api/wardrobe/<user_id>/<item_id>/similar')
+def similar_items(user_id, item_id):
+    items_by_id = {item["id"]: item for item in wardrobe_index.items(user_id)}
+    if item_id not in items_by_id:
+        return jsonify({"error": "Item not found"}), 404
+    k = request.args.get('k', 5, type=int)
+    matches = embedding_store.similar(user_id, item_id, k)
+    if matches is None:
+        return jsonify({"error": "No embedding stored for this item"}), 404
+    similar = [
+        {"item": items_by_id[match_id], "score": score}
+        for match_id, score in matches if match_id in items_by_id
+    ]
+    return jsonify({"item_id": item_id, "similar": similar, "count": len(similar)})
+
 @app.route('/api/outfits/<user_id>', methods=['GET', 'POST'])
 def manage_outfits(user_id):
     if request.method == 'GET':
@@ -393,19 +684,24 @@ def manage_outfits(user_id):
         return jsonify({"outfits": outfits, "count": len(outfits)})
     elif request.method == 'POST':
         data = request.json
-        user_data = load_user_data(user_id)
+        if data and data.get("outfit_id"):
+            suggestion = outfit_cache.get_outfit(user_id, data["outfit_id"])
+            if suggestion is None and "items" not in data:
+                return jsonify({"error": "Outfit suggestion not found or expired"}), 404
+            if suggestion is not None:
+                data = {**data, "items": [item["id"] for item in suggestion["items"]],
+                        "occasion": data.get("occasion", suggestion["occasion"])}
         if not data or "items" not in data:
             return jsonify({"error": "Missing outfit data"}), 400
         outfit_id = str(uuid.uuid4())
         outfit = {
             "id": outfit_id,
-            "name": data.get("name", f"Outfit {len(user_data['outfits']) + 1}"),
+            "name": data.get("name", f"Outfit {len(storage.list_outfits(user_id)) + 1}"),
             "occasion": data.get("occasion", "casual"),
             "date_created": datetime.now().isoformat(),
             "items": data["items"]
         }
-        user_data["outfits"].append(outfit)
-        save_user_data(user_id, user_data)
+        storage.add_outfit(user_id, outfit)
         return jsonify({"status": "success", "outfit": outfit})
 
 if __name__ == '__main__':
@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One fresh interpreter per backend so peak RSS belongs to that backend alone.
+# Embeds every image once (batch 1 latency), then again in batches, and saves
+# the embeddings for the agreement comparison.
+PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import numpy as np
+from embedding_backends import create_backend
+from image_pipeline import ImagePipeline
+from inference import warm_up
+name, base, weights, tflite_path, paths, batch_size, out = {args!r}
+start = time.perf_counter()
+backend = create_backend(name, weights, tflite_path=tflite_path, tflite_base=base).load()
+warm_up(backend, backend.input_shape)
+load_seconds = time.perf_counter() - start
+pipeline = ImagePipeline(model_size=backend.input_size)
+inputs = []
+for path in paths:
+    with open(path, "rb") as f:
+        inputs.append(backend.preprocess(pipeline.model_input(pipeline.decode(f.read()))))
+inputs = np.stack(inputs).astype(np.float32)
+times, embeddings = [], []
+for x in inputs:
+    start = time.perf_counter()
+    embeddings.append(backend.predict_on_batch(x[None])[0])
+    times.append(time.perf_counter() - start)
+start = time.perf_counter()
+for i in range(0, len(inputs), batch_size):
+    backend.predict_on_batch(inputs[i:i + batch_size])
+batched = time.perf_counter() - start
+np.save(out, np.stack(embeddings).astype(np.float32))
+print(json.dumps({{"name": backend.name, "dim": backend.dim, "load_seconds": load_seconds,
+                  "p50_ms": 1000 * float(np.percentile(times, 50)), "p95_ms": 1000 * float(np.percentile(times, 95)),
+                  "batched_images_per_s": len(inputs) / batched,
+                  "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def garment(rng, color, shape, size=400):
+    # Flat-coloured silhouette on a light background with lighting and noise,
+    # so images of the same colour and shape form natural neighbour groups
+    img = np.full((size, size, 3), 235, np.float32)
+    mask = np.zeros((size, size), np.uint8)
+    offset = rng.integers(-30, 30, 2)
+    center = (size // 2 + int(offset[0]), size // 2 + int(offset[1]))
+    if shape == "shirt":
+        cv2.rectangle(mask, (center[0] - 90, center[1] - 110), (center[0] + 90, center[1] + 120), 1, -1)
+        cv2.rectangle(mask, (center[0] - 150, center[1] - 110), (center[0] + 150, center[1] - 40), 1, -1)
+    elif shape == "trousers":
+        cv2.rectangle(mask, (center[0] - 80, center[1] - 160), (center[0] - 10, center[1] + 160), 1, -1)
+        cv2.rectangle(mask, (center[0] + 10, center[1] - 160), (center[0] + 80, center[1] + 160), 1, -1)
+        cv2.rectangle(mask, (center[0] - 80, center[1] - 160), (center[0] + 80, center[1] - 100), 1, -1)
+    elif shape == "dress":
+        points = np.array([(center[0] - 50, center[1] - 150), (center[0] + 50, center[1] - 150),
+                           (center[0] + 130, center[1] + 150), (center[0] - 130, center[1] + 150)], np.int32)
+        cv2.fillPoly(mask, [points], 1)
+    else:
+        cv2.ellipse(mask, center, (140, 70), 0, 0, 360, 1, -1)
+    shade = rng.uniform(0.8, 1.1)
+    img[mask == 1] = np.asarray(color, np.float32) * shade
+    img += rng.normal(0, 8, size=img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def synthetic_images(directory, per_group, seed=0):
+    rng = np.random.default_rng(seed)
+    colors = {"red": (40, 40, 200), "navy": (90, 40, 20), "olive": (40, 120, 110), "white": (250, 250, 250)}
+    paths = []
+    for color_name, color in colors.items():
+        for shape in ("shirt", "trousers", "dress", "shoe"):
+            for i in range(per_group):
+                path = os.path.join(directory, f"{color_name}_{shape}_{i}.jpg")
+                cv2.imwrite(path, garment(rng, color, shape), [cv2.IMWRITE_JPEG_QUALITY, 90])
+                paths.append(path)
+    return paths
+
+
+def neighbours(embeddings, k):
+    normed = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    similarity = normed @ normed.T
+    np.fill_diagonal(similarity, -np.inf)
+    return np.argsort(-similarity, axis=1)[:, :k]
+
+
+def overlap_at_k(reference, candidate, k):
+    # Mean fraction of each image's k nearest neighbours that both backends agree on
+    ref, cand = neighbours(reference, k), neighbours(candidate, k)
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref, cand)]))
+
+
+def mean_cosine(reference, candidate):
+    # Only meaningful between a model and its own quantised copy (same space)
+    dot = np.sum(reference * candidate, axis=1)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    return float(np.mean(dot / np.maximum(norms, 1e-12)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, memory and embedding agreement of the embedding "
+                                                 "backends selectable with EMBEDDING_BACKEND")
+    parser.add_argument("--backends", nargs="+",
+                        default=["resnet50", "mobilenet_v2", "tflite_int8:resnet50", "tflite_int8:mobilenet_v2"],
+                        help="names as in EMBEDDING_BACKEND; tflite_int8:<base> picks the quantised network")
+    parser.add_argument("--images", help="directory of local images (default: synthetic garments)")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--per-group", type=int, default=4, help="synthetic images per colour/shape group")
+    parser.add_argument("--weights", default="imagenet", help="IMAGE_MODEL_WEIGHTS ('none' offline)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("-k", type=int, default=5, help="neighbours compared for overlap@k")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="convert TFLite models with the images as calibration data (full int8)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3")
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = sorted(os.path.join(args.images, name) for name in os.listdir(args.images)
+                           if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')))[:args.limit]
+        else:
+            os.makedirs(os.path.join(tmp, "images"))
+            paths = synthetic_images(os.path.join(tmp, "images"), args.per_group)
+        print(f"{len(paths)} images, weights={args.weights}")
+
+        results, embeddings = [], {}
+        for spec in args.backends:
+            name, _, base = spec.partition(":")
+            tflite_path = None
+            if name == "tflite_int8":
+                base = base or "resnet50"
+                # Converted up front so the probe measures serving, not conversion
+                tflite_path = os.path.join(tmp, f"{base}-int8.tflite")
+                command = [sys.executable, os.path.join(ROOT, "embedding_backends.py"), "--base", base,
+                           "--weights", args.weights, "--output", tflite_path]
+                if args.calibrate:
+                    command += ["--calibration-dir", os.path.dirname(paths[0])]
+                subprocess.run(command, env=env, capture_output=True, check=True)
+            out = os.path.join(tmp, f"{spec.replace(':', '-')}.npy")
+            source = PROBE.format(root=ROOT, args=(name, base or "resnet50", args.weights, tflite_path, paths,
+                                                   args.batch_size, out))
+            output = subprocess.run([sys.executable, "-c", source], env=env, capture_output=True, text=True,
+                                    check=True).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            if tflite_path:
+                r["model_mb"] = os.path.getsize(tflite_path) / 1e6
+            embeddings[spec] = np.load(out)
+            results.append(r)
+
+        reference = args.backends[0]
+        print(f"{'backend':<25} {'dim':>5} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} {'batched img/s':>14} "
+              f"{'peak RSS MB':>12} {f'overlap@{args.k}':>10} {'cosine':>7}")
+        for spec, r in zip(args.backends, results):
+            r["overlap"] = overlap_at_k(embeddings[reference], embeddings[spec], args.k)
+            # A quantised model is compared with the float network it came from
+            name, _, base = spec.partition(":")
+            float_spec = base or "resnet50"
+            r["cosine"] = None
+            if name == "tflite_int8" and float_spec in embeddings:
+                r["cosine"] = mean_cosine(embeddings[float_spec], embeddings[spec])
+            cosine = f"{r['cosine']:.3f}" if r["cosine"] is not None else "-"
+            print(f"{r['name']:<25} {r['dim']:>5} {r['load_seconds']:>7.1f} {r['p50_ms']:>7.1f} {r['p95_ms']:>7.1f} "
+                  f"{r['batched_images_per_s']:>14.1f} {r['peak_rss_mb']:>12.0f} {r['overlap']:>10.2f} {cosine:>7}")
+    print(f"overlap@{args.k}: share of each image's nearest neighbours that match {reference}")
+    print("cosine: mean similarity to the float model a TFLite backend was converted from")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
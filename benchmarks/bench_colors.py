@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from colors import ColorExtractor  # noqa: E402
+
+GARMENT_COLORS = {
+    "red": (200, 30, 30), "green": (40, 160, 60), "blue": (30, 60, 190), "yellow": (235, 215, 50),
+    "black": (25, 25, 25), "white": (240, 240, 240), "gray": (130, 130, 130), "pink": (240, 150, 180),
+}
+
+
+def legacy_get_colors(img_path):
+    # Implementation before the ColorExtractor, kept for comparison
+    img = cv2.imread(img_path)
+    if img is None:
+        return ["unknown"]
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    pixels = np.float32(img.reshape(-1, 3))
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
+    _, labels, palette = cv2.kmeans(pixels, 3, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+    r, g, b = palette[np.argmax(np.bincount(labels.flatten()))]
+    color_map = {
+        "red": (r > 150 and g < 100 and b < 100),
+        "green": (r < 100 and g > 150 and b < 100),
+        "blue": (r < 100 and g < 100 and b > 150),
+        "yellow": (r > 150 and g > 150 and b < 100),
+        "purple": (r > 100 and g < 100 and b > 100),
+        "orange": (r > 150 and g > 100 and b < 100),
+        "pink": (r > 150 and g < 100 and b > 100),
+        "black": (r < 50 and g < 50 and b < 50),
+        "white": (r > 200 and g > 200 and b > 200),
+        "gray": (r > 50 and r < 200 and g > 50 and g < 200 and b > 50 and b < 200 and max(r, g, b) - min(r, g, b) < 50)
+    }
+    return [next((name for name, matched in color_map.items() if matched), "other")]
+
+
+def synthetic_image(rng, color, width, height):
+    # Garment-shaped block on a light backdrop with sensor noise
+    backdrop = (225, 222, 215) if color not in ("white",) else (90, 90, 95)
+    img = np.empty((height, width, 3), dtype=np.float32)
+    img[:] = backdrop
+    top, left = int(height * 0.15), int(width * 0.2)
+    img[top:height - top, left:width - left] = color
+    img += rng.normal(0, 8, size=(height, width, 1))
+    return cv2.cvtColor(np.clip(img, 0, 255).astype(np.uint8), cv2.COLOR_RGB2BGR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare k-means colour naming against ColorExtractor")
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    names = list(GARMENT_COLORS)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths, expected = [], []
+        for i in range(args.images):
+            name = names[i % len(names)]
+            path = os.path.join(tmp, f"{i}_{name}.jpg")
+            cv2.imwrite(path, synthetic_image(rng, GARMENT_COLORS[name], args.width, args.height))
+            paths.append(path)
+            expected.append(name)
+
+        extractor = ColorExtractor()
+        runs = [("extractor", lambda: [extractor.extract(p) for p in paths]),
+                ("extractor batch", lambda: extractor.extract_batch(paths))]
+        if not args.skip_legacy:
+            runs.insert(0, ("legacy kmeans", lambda: [legacy_get_colors(p) for p in paths]))
+
+        print(f"{args.images} images at {args.width}x{args.height}")
+        print(f"{'method':<16} {'ms/image':>10} {'accuracy':>9}")
+        for label, fn in runs:
+            start = time.perf_counter()
+            results = fn()
+            elapsed = time.perf_counter() - start
+            accuracy = np.mean([result[0] == name for result, name in zip(results, expected)])
+            print(f"{label:<16} {elapsed / len(paths) * 1000:>10.1f} {accuracy:>9.2f}")
+
+        palette = extractor.palette(extractor.load(paths[0]), top=3)
+        print("ranked palette for", os.path.basename(paths[0]), palette)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter per mode so peak RSS belongs to that mode alone.
+# Model inference is left out: both paths feed ResNet50 the same shaped input.
+PROBE = """
+import json, os, resource, sys, time
+sys.path.insert(0, {root!r})
+import numpy as np
+from colors import ColorExtractor
+from image_pipeline import ImagePipeline, resnet_preprocess
+mode, paths, out = {mode!r}, {paths!r}, {out!r}
+extractor = ColorExtractor()
+pipeline = ImagePipeline()
+# Imported in both modes, as a worker running ResNet50 in-process has it loaded anyway
+from tensorflow.keras.preprocessing import image
+from tensorflow.keras.applications.resnet50 import preprocess_input
+if mode == "two decodes":
+    def upload(data, target):
+        with open(target, "wb") as f:
+            f.write(data)
+        x = preprocess_input(image.img_to_array(image.load_img(target, target_size=(224, 224))))
+        return x, extractor.extract(target)
+else:
+    from concurrent.futures import ThreadPoolExecutor
+    writer = ThreadPoolExecutor(max_workers=2)
+    def save(target, data):
+        with open(target, "wb") as f:
+            f.write(data)
+    def upload(data, target):
+        saved = writer.submit(save, target, data)
+        rgb = pipeline.decode(data)
+        x = resnet_preprocess(pipeline.model_input(rgb))
+        colors = extractor.extract(rgb)
+        saved.result()
+        return x, colors
+blobs = [open(p, "rb").read() for p in paths]
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+times = []
+for i, data in enumerate(blobs):
+    start = time.perf_counter()
+    upload(data, os.path.join(out, f"{{i}}.jpg"))
+    times.append(time.perf_counter() - start)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"median_ms": 1000 * sorted(times)[len(times) // 2], "peak_rss_mb": peak / 1024,
+                  "growth_mb": (peak - baseline) / 1024}}))
+"""
+
+
+def photo(rng, width, height):
+    # Smooth garment-like gradients plus sensor noise: compresses like a photo
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.stack([128 + 100 * np.sin(x / 300), 128 + 100 * np.cos(y / 250), 128 + 60 * np.sin((x + y) / 400)], -1)
+    img += rng.normal(0, 6, size=(height, width, 1))
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-upload latency and peak memory: save + two decodes "
+                                                 "vs one decode from memory")
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.images):
+            path = os.path.join(tmp, f"photo_{i}.jpg")
+            cv2.imwrite(path, photo(rng, args.width, args.height), [cv2.IMWRITE_JPEG_QUALITY, 92])
+            paths.append(path)
+        print(f"{args.images} JPEGs of {args.width}x{args.height}")
+        print(f"{'mode':<12} {'median ms':>10} {'peak RSS MB':>12} {'growth MB':>10}")
+        for mode in ("two decodes", "decode once"):
+            out = tempfile.mkdtemp(dir=tmp)
+            env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3")
+            output = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT, mode=mode, paths=paths, out=out)],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<12} {r['median_ms']:>10.1f} {r['peak_rss_mb']:>12.0f} {r['growth_mb']:>10.0f}")
+    print("growth: peak RSS increase while processing the uploads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import BatchInferenceEngine  # noqa: E402
+
+
+class FakeModel:
+    # Mimics a framework call: fixed per-call overhead plus per-sample cost
+    def __init__(self, call_overhead_ms=25.0, per_item_ms=4.0, dim=2048):
+        self.call_overhead = call_overhead_ms / 1000.0
+        self.per_item = per_item_ms / 1000.0
+        self.dim = dim
+
+    def predict_on_batch(self, batch):
+        time.sleep(self.call_overhead + self.per_item * len(batch))
+        return np.repeat(batch.reshape(len(batch), -1)[:, :1], self.dim, axis=1)
+
+
+def load_model(name):
+    if name == "fake":
+        return FakeModel()
+    from tensorflow.keras.applications import ResNet50
+    return ResNet50(weights='imagenet', include_top=False, pooling='avg')
+
+
+def run(model, clients, requests_per_client, max_batch_size, max_wait_ms):
+    engine = BatchInferenceEngine(model.predict_on_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    rng = np.random.default_rng(0)
+    sample = rng.uniform(-100, 100, size=(224, 224, 3)).astype(np.float32)
+    engine.submit(sample)  # warm-up, excluded from the measurement
+    engine.stats.update({"batches": 0, "items": 0, "max_batch": 0})
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        local = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            engine.submit(sample)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.shutdown()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "max_batch_size": max_batch_size,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "mean_batch": engine.stats["items"] / max(engine.stats["batches"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batch size 1 against micro-batched embedding inference")
+    parser.add_argument("--model", choices=["fake", "resnet50"], default="fake")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--batch-sizes", default="1,4,8,16")
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    print(f"model={args.model} clients={args.clients} requests/client={args.requests} max_wait_ms={args.max_wait_ms}")
+    print(f"{'batch':>6} {'img/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'avg batch':>10}")
+    for size in [int(s) for s in args.batch_sizes.split(",")]:
+        result = run(model, args.clients, args.requests, size, args.max_wait_ms)
+        print(f"{result['max_batch_size']:>6} {result['throughput']:>9.1f} {result['p50_ms']:>9.1f} "
+              f"{result['p95_ms']:>9.1f} {result['mean_batch']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
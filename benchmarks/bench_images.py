@@ -0,0 +1,76 @@
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def photo(rng, width, height):
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.stack([128 + 100 * np.sin(x / 300), 128 + 100 * np.cos(y / 250), 128 + 60 * np.sin((x + y) / 400)], -1)
+    img += rng.normal(0, 6, size=(height, width, 1))
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def page_view(client, urls, headers=None):
+    # Bytes sent and server CPU for loading every image of one wardrobe page
+    sent, start = 0, time.process_time()
+    etags = []
+    for url in urls:
+        response = client.get(url, headers=headers or {})
+        sent += len(response.get_data())
+        etags.append(response.headers.get('ETag'))
+        response.close()
+    return sent, time.process_time() - start, etags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes and server CPU per wardrobe page view: originals vs renditions")
+    parser.add_argument("--items", type=int, default=24)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    args = parser.parse_args()
+
+    os.environ.update(MODEL_WARMUP="0", RENDITION_PREGENERATE="")
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, ROOT)
+    import app as stylestack
+
+    # Keep the upload path cheap: classification is not what is measured here
+    stylestack.image_model_available = lambda: False
+    client = stylestack.app.test_client()
+    rng = np.random.default_rng(0)
+    ok, encoded = cv2.imencode('.jpg', photo(rng, args.width, args.height), [cv2.IMWRITE_JPEG_QUALITY, 92])
+    urls = []
+    for i in range(args.items):
+        response = client.post('/api/upload/bench', data={'file': (io.BytesIO(encoded.tobytes()), f'shirt_{i}.jpg')},
+                               content_type='multipart/form-data')
+        urls.append(response.get_json()['item']['image_url'])
+
+    webp = {'Accept': 'image/avif,image/webp,*/*'}
+    small = [f"{url}?size=small" for url in urls]
+    rows = [("originals", page_view(client, urls))]
+    rows.append(("small, first view", page_view(client, small, webp)))
+    rows.append(("small, cached", page_view(client, small, webp)))
+    etags = rows[-1][1][2]
+    revalidated = [0, time.process_time()]
+    for url, etag in zip(small, etags):
+        revalidated[0] += len(client.get(url, headers={**webp, 'If-None-Match': etag}).get_data())
+    rows.append(("small, revalidated", (revalidated[0], time.process_time() - revalidated[1], None)))
+
+    print(f"{args.items} items, {args.width}x{args.height} JPEG originals")
+    print(f"{'page view':<20} {'KB sent':>10} {'server CPU ms':>14}")
+    for label, (sent, cpu, _) in rows:
+        print(f"{label:<20} {sent / 1024:>10.0f} {cpu * 1000:>14.0f}")
+    print("first view renders the renditions (normally done at upload, see RENDITION_PREGENERATE); "
+          "with Cache-Control immutable browsers skip even the revalidation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model import ChatbotModel  # noqa: E402
+
+
+def build_model():
+    # Train into a temporary directory so the benchmark never touches chatbot_model.pkl
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            return ChatbotModel()
+        finally:
+            os.chdir(cwd)
+
+
+def synthetic_queries(model, count, rng):
+    words = sorted({word for examples in model.training_data.values() for text in examples for word in text.split()})
+    words += ["zebra", "tomorrow?", "PLEASE", "outfit!!", "a"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(0, 8))) for _ in range(count)]
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    result = fn(queries)
+    return (time.perf_counter() - start) / len(queries) * 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="sklearn vs compiled NumPy intent classification")
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    model = build_model()
+    rng = random.Random(0)
+    training = [text for examples in model.training_data.values() for text in examples]
+    queries = training + synthetic_queries(model, args.queries, rng)
+
+    sklearn_us, expected = timed(lambda qs: [model.predict_intent_sklearn(q) for q in qs], queries)
+    compiled_us, compiled = timed(lambda qs: [str(model.scorer.predict(q)) for q in qs], queries)
+    model._cached_intent.cache_clear()
+    cold_us, _ = timed(lambda qs: [model.predict_intent(q) for q in qs], queries)
+    cached_us, cached = timed(lambda qs: [model.predict_intent(q) for q in qs], queries)
+    batch_us, batched = timed(model.predict_intents, queries)
+
+    mismatches = [q for q, a, b, c, d in zip(queries, expected, compiled, cached, batched) if len({a, b, c, d}) > 1]
+    print(f"{len(queries)} queries")
+    print(f"{'path':<22} {'us/query':>10}")
+    for label, value in [("sklearn", sklearn_us), ("compiled", compiled_us),
+                         ("lru miss", cold_us), ("lru hit", cached_us), ("compiled batch", batch_us)]:
+        print(f"{label:<22} {value:>10.1f}")
+    print(f"parity mismatches: {len(mismatches)}")
+    if mismatches:
+        print("first mismatches:", mismatches[:5])
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outfit_engine import COLORS, OCCASION_CATEGORIES, OCCASIONS, SEASONS, OutfitEngine  # noqa: E402
+
+CATEGORIES = ['tops', 'bottoms', 'dresses', 'outerwear', 'shoes', 'accessories']
+
+
+def synthetic_wardrobe(size, rng):
+    return [{
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "name": f"item{i}",
+        "category": rng.choice(CATEGORIES),
+        "colors": [rng.choice(COLORS[:10])],
+        "seasons": rng.sample(SEASONS, k=rng.randint(1, 4)),
+        "occasions": rng.sample(OCCASIONS, k=rng.randint(1, 3)),
+    } for i in range(size)]
+
+
+def legacy_suggestions(wardrobe, occasion, seasons, num_outfits=3):
+    # Selection loop of the previous generate_outfit_suggestions
+    occasion_items = [item for item in wardrobe if occasion in item["occasions"]]
+    if len(occasion_items) < 4:
+        occasion_items = wardrobe
+    season_items = [item for item in occasion_items if any(season in item["seasons"] for season in seasons)]
+    items_pool = season_items if len(season_items) >= 4 else occasion_items
+    target_cats = OCCASION_CATEGORIES.get(occasion, ["tops", "bottoms", "shoes"])
+    outfits = []
+    for _ in range(min(num_outfits, len(items_pool) // len(target_cats))):
+        items = []
+        for category in target_cats:
+            cat_items = [item for item in items_pool if item["category"] == category]
+            if cat_items:
+                chosen_item = random.choice(cat_items)
+                items.append(chosen_item)
+                items_pool.remove(chosen_item)
+        outfits.append((len(items) / len(target_cats), items))
+    return outfits
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Outfit generation cost over synthetic wardrobes")
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--outfits", type=int, default=3)
+    parser.add_argument("--embedding-dim", type=int, default=0, help="attach random embeddings of this size")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = OutfitEngine()
+    seasons = ["fall", "winter"]
+    cats = OCCASION_CATEGORIES["casual"]
+    # First call pays one-off NumPy/RNG setup that would otherwise land in "cold"
+    engine.suggest(engine.prepare(synthetic_wardrobe(50, random.Random(0)), cats), cats, "casual", seasons)
+    print(f"{'items':>7} {'legacy ms':>10} {'cold ms':>9} {'warm ms':>9} {'outfits':>8} {'best score':>11} "
+          f"{'repeatable':>11}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        rng = random.Random(size)
+        wardrobe = synthetic_wardrobe(size, rng)
+        lookup = None
+        if args.embedding_dim:
+            vectors = np.random.default_rng(size).normal(size=(size, args.embedding_dim)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            rows = {item["id"]: vectors[i] for i, item in enumerate(wardrobe)}
+            lookup = rows.get
+
+        legacy_ms, _ = timed(lambda: legacy_suggestions(wardrobe, "casual", seasons, args.outfits), args.repeat)
+        cold_ms, _ = timed(lambda: engine.suggest(engine.prepare(wardrobe, cats, lookup), cats, "casual", seasons,
+                                                  args.outfits, seed=7), max(1, args.repeat // 4))
+        prepared = engine.prepare(wardrobe, cats, lookup, cache_key=("bench", size))
+        warm_ms, result = timed(lambda: engine.suggest(engine.prepare(wardrobe, cats, lookup, cache_key=("bench", size)),
+                                                       cats, "casual", seasons, args.outfits, seed=7), args.repeat)
+        again = engine.suggest(prepared, cats, "casual", seasons, args.outfits, seed=7)
+        repeatable = [[i["id"] for i in items] for _, items in result] == [[i["id"] for i in items] for _, items in again]
+        # Items are never reused, so the smallest category caps the count
+        expected = min(args.outfits, min(len(group.items) for group in prepared.values()))
+        assert len(result) == expected, f"{len(result)} outfits, expected {expected}"
+        best = result[0][0] if result else 0.0
+        print(f"{size:>7} {legacy_ms:>10.2f} {cold_ms:>9.2f} {warm_ms:>9.2f} {len(result):>8} {best:>11.3f} "
+              f"{str(repeatable):>11}")
+
+
+if __name__ == "__main__":
+    main()
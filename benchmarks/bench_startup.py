@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside a fresh interpreter so every measurement pays full import cost
+PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter() - start
+mode = {mode!r}
+if mode == "eager":
+    app.image_model.get()
+    app.chatbot_model.get()
+elif mode == "warmup":
+    while not (app.image_model.ready and app.chatbot_model.ready):
+        if "failed" in (app.image_model.state, app.chatbot_model.state):
+            break
+        time.sleep(0.01)
+ready = time.perf_counter() - start
+client = app.app.test_client()
+print(json.dumps({{"import_s": imported, "ready_s": ready, "healthz": client.get("/healthz").status_code,
+                  "readyz": client.get("/readyz").status_code}}))
+"""
+
+
+def run(mode, weights):
+    env = dict(os.environ, MODEL_WARMUP="1" if mode == "warmup" else "0", IMAGE_MODEL_WEIGHTS=weights,
+               TF_CPP_MIN_LOG_LEVEL="3")
+    with tempfile.TemporaryDirectory() as tmp:
+        output = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT, mode=mode)], cwd=tmp, env=env,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time from interpreter start to import and to model readiness")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--weights", default="imagenet", help="IMAGE_MODEL_WEIGHTS for the probe ('none' offline)")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'import s':>9} {'ready s':>8} {'/healthz':>9} {'/readyz':>8}")
+    for mode, label in (("lazy", "lazy"), ("warmup", "warmup"), ("eager", "eager")):
+        results = [run(mode, args.weights) for _ in range(args.runs)]
+        print(f"{label:<8} {statistics.median(r['import_s'] for r in results):>9.2f} "
+              f"{statistics.median(r['ready_s'] for r in results):>8.2f} "
+              f"{results[-1]['healthz']:>9} {results[-1]['readyz']:>8}")
+    print("lazy: import only; warmup: background load + dummy inference; eager: load before serving (old behaviour)")
+
+
+if __name__ == "__main__":
+    main()
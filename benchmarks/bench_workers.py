@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One app worker: embeds `requests` random images from `threads` threads,
+# either with its own ResNet50 or through the shared inference server
+WORKER = """
+import json, sys, threading, time
+import numpy as np
+sys.path.insert(0, {root!r})
+mode, socket_path, requests, threads = {mode!r}, {socket!r}, {requests}, {threads}
+if mode == "in-process":
+    from embedding_backends import load_resnet50
+    from inference import BatchInferenceEngine, warm_up
+    model = load_resnet50({weights!r})
+    warm_up(model)
+    engine = BatchInferenceEngine(model.predict_on_batch)
+    embed = engine.submit
+else:
+    from inference_server import InferenceClient
+    client = InferenceClient(socket_path)
+    embed = client.embed
+x = np.random.default_rng(0).uniform(-100, 100, (224, 224, 3)).astype(np.float32)
+print("ready", flush=True)
+sys.stdin.readline()
+def run(n):
+    for _ in range(n):
+        embed(x)
+start = time.perf_counter()
+pool = [threading.Thread(target=run, args=(requests // threads,)) for _ in range(threads)]
+for t in pool: t.start()
+for t in pool: t.join()
+print(json.dumps({{"seconds": time.perf_counter() - start, "requests": requests // threads * threads}}), flush=True)
+"""
+
+
+def peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def start_server(socket_path, weights):
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "inference_server.py"), "--socket", socket_path,
+                               "--weights", weights], env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3"),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sys.path.insert(0, ROOT)
+    from inference_server import InferenceClient
+    client = InferenceClient(socket_path, retry_interval=0)
+    deadline = time.time() + 300
+    while not client.available():
+        if server.poll() is not None or time.time() > deadline:
+            raise RuntimeError("Inference server did not start")
+        time.sleep(0.5)
+    return server
+
+
+def run(mode, workers, requests, threads, weights, socket_path):
+    server = start_server(socket_path, weights) if mode == "sidecar" else None
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3")
+    source = WORKER.format(root=ROOT, mode=mode, socket=socket_path, requests=requests, threads=threads,
+                           weights=weights)
+    procs = [subprocess.Popen([sys.executable, "-c", source], env=env, stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) for _ in range(workers)]
+    try:
+        for proc in procs:
+            proc.stdout.readline()
+        start = time.perf_counter()
+        for proc in procs:
+            proc.stdin.write("go\n")
+            proc.stdin.flush()
+        results = [json.loads(proc.stdout.readline()) for proc in procs]
+        elapsed = time.perf_counter() - start
+        rss = sum(peak_rss_mb(proc.pid) for proc in procs)
+        if server is not None:
+            rss += peak_rss_mb(server.pid)
+    finally:
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+        if server is not None:
+            server.terminate()
+            server.wait()
+    total = sum(r["requests"] for r in results)
+    return {"mode": mode, "workers": workers, "peak_rss_mb": rss, "images_per_s": total / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and throughput of N app workers, each with its own "
+                                                 "ResNet50 vs one shared inference server")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=64, help="images embedded per worker")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent requests per worker")
+    parser.add_argument("--weights", default="imagenet", help="IMAGE_MODEL_WEIGHTS ('none' offline)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "inference.sock")
+        print(f"{'mode':<11} {'workers':>7} {'peak RSS MB':>12} {'images/s':>9}")
+        for workers in args.workers:
+            for mode in ("in-process", "sidecar"):
+                r = run(mode, workers, args.requests, args.threads, args.weights, socket_path)
+                results.append(r)
+                print(f"{r['mode']:<11} {r['workers']:>7} {r['peak_rss_mb']:>12.0f} {r['images_per_s']:>9.1f}")
+    print("peak RSS is summed over all worker processes plus the server (sidecar)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ["upload", "wardrobe", "outfits", "organize", "chat"]
+CATEGORIES = ["tops", "bottoms", "dresses", "outerwear", "shoes", "accessories"]
+COLORS = ["black", "white", "gray", "red", "green", "blue", "yellow", "orange", "purple", "pink"]
+SEASONS = ["spring", "summer", "fall", "winter"]
+OCCASIONS = ["casual", "work", "formal", "athletic"]
+FILENAMES = ["shirt", "jeans", "sneaker", "dress", "coat", "hat", "tee", "shorts", "boot", "scarf"]
+QUERIES = ["organize my wardrobe", "what should I wear to work tomorrow", "suggest a casual outfit",
+           "what's the weather like", "what can you do", "help me pick something formal"]
+
+
+class _WeatherHandler(BaseHTTPRequestHandler):
+    # Answers the weatherapi.com forecast call with a fixed forecast
+    def do_GET(self):
+        body = json.dumps({"forecast": {"forecastday": [{"day": {
+            "avgtemp_f": 64.0, "condition": {"text": "Partly cloudy"}}}]}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_weather_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _WeatherHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+
+class FakeImageModel:
+    # Deterministic stand-in for ResNet50: a fixed random projection of the
+    # downsampled input, plus an optional fixed cost per call and per image
+    def __init__(self, dim=2048, call_ms=0.0, per_image_ms=0.0, seed=0):
+        self.projection = np.random.default_rng(seed).standard_normal((28 * 28 * 3, dim)).astype(np.float32)
+        self.call_ms = call_ms
+        self.per_image_ms = per_image_ms
+
+    def predict_on_batch(self, batch):
+        if self.call_ms or self.per_image_ms:
+            time.sleep((self.call_ms + self.per_image_ms * len(batch)) / 1000.0)
+        pooled = np.asarray(batch, dtype=np.float32)[:, ::8, ::8, :].reshape(len(batch), -1)
+        return np.maximum(pooled @ self.projection, 0)
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale / 1024
+
+
+def reset_peak_rss():
+    # Linux only: restarts VmHWM so each phase reports its own peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def synthetic_jpeg(rng, size):
+    height, width = size
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = rng.integers(180, 240, size=3)
+    top, left = height // 6, width // 5
+    img[top:height - top, left:width - left] = rng.integers(0, 255, size=3)
+    noise = rng.integers(0, 12, size=(height, width, 1), dtype=np.uint8)
+    ok, encoded = cv2.imencode(".jpg", img + noise)
+    return encoded.tobytes()
+
+
+def synthetic_item(rng, index):
+    category = CATEGORIES[rng.integers(len(CATEGORIES))]
+    return {
+        "id": f"item-{index}",
+        "name": f"{category}-{index}",
+        "filepath": "",
+        "image_url": "",
+        "upload_date": "2024-01-01T00:00:00",
+        "category": category,
+        "colors": [COLORS[rng.integers(len(COLORS))]],
+        "seasons": sorted(set(SEASONS[i] for i in rng.integers(len(SEASONS), size=2))),
+        "occasions": sorted(set(OCCASIONS[i] for i in rng.integers(len(OCCASIONS), size=2))),
+        "tags": []
+    }
+
+
+def seed_users(stylestack, users, wardrobe_size, dim, seed):
+    # Writes wardrobes straight into storage; the upload endpoint is measured separately
+    rng = np.random.default_rng(seed)
+    for u in range(users):
+        user_id = f"load-user-{u}"
+        for i in range(wardrobe_size):
+            item = synthetic_item(rng, i)
+            stylestack.storage.add_item(user_id, item)
+            stylestack.embedding_store.add(user_id, item["id"], rng.standard_normal(dim).astype(np.float32))
+        stylestack.wardrobe_index.invalidate(user_id)
+    return [f"load-user-{u}" for u in range(users)]
+
+
+class TestClientTarget:
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.local = threading.local()
+
+    def _client(self):
+        # Flask's test client is not meant to be shared between threads
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.client.application.test_client()
+        return client
+
+    def request(self, method, path, **kwargs):
+        response = self._client().open(path, method=method, **kwargs)
+        response.close()
+        return response.status_code
+
+
+class ServerTarget:
+    # The app behind werkzeug's threaded server on a local port, driven over HTTP
+    def __init__(self, app):
+        import requests
+        from werkzeug.serving import make_server
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.requests = requests
+        self.local = threading.local()
+
+    def request(self, method, path, data=None, json=None, content_type=None, query_string=None):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        files = None
+        if content_type == "multipart/form-data":
+            files = {name: (value[1], value[0]) for name, value in data.items()}
+            data = None
+        return session.request(method, self.base + path, params=query_string, json=json, data=data,
+                               files=files).status_code
+
+
+def make_requests(endpoint, users, rng, image_size, unique_uploads):
+    today = date(2024, 6, 1)
+    images = {}
+
+    def upload(i):
+        key = i if unique_uploads else i % 8
+        if key not in images:
+            images[key] = synthetic_jpeg(np.random.default_rng(key), image_size)
+        name = f"{FILENAMES[i % len(FILENAMES)]}_{i}.jpg"
+        return "POST", f"/api/upload/{users[i % len(users)]}", {
+            "data": {"file": (io.BytesIO(images[key]), name)}, "content_type": "multipart/form-data"}
+
+    def wardrobe(i):
+        query = {"limit": 50}
+        if rng.random() < 0.5:
+            query["category"] = CATEGORIES[rng.integers(len(CATEGORIES))]
+        if rng.random() < 0.3:
+            query["color"] = COLORS[rng.integers(len(COLORS))]
+        return "GET", f"/api/wardrobe/{users[i % len(users)]}", {"query_string": query}
+
+    def outfits(i):
+        query = {"occasion": OCCASIONS[rng.integers(len(OCCASIONS))],
+                 "date": (today + timedelta(days=int(rng.integers(7)))).isoformat()}
+        return "GET", f"/api/outfits/{users[i % len(users)]}", {"query_string": query}
+
+    def organize(i):
+        return "GET", f"/api/organize/{users[i % len(users)]}", {}
+
+    def chat(i):
+        return "POST", f"/api/chat/{users[i % len(users)]}", {"json": {"query": QUERIES[rng.integers(len(QUERIES))]}}
+
+    return {"upload": upload, "wardrobe": wardrobe, "outfits": outfits, "organize": organize, "chat": chat}[endpoint]
+
+
+def run_endpoint(target, make_request, count, concurrency):
+    # make_request runs up front so building payloads isn't timed
+    planned = [make_request(i) for i in range(count)]
+    latencies, statuses = [0.0] * count, [0] * count
+
+    def call(i):
+        method, path, kwargs = planned[i]
+        start = time.perf_counter()
+        try:
+            statuses[i] = target.request(method, path, **kwargs)
+        except Exception:
+            statuses[i] = -1
+        latencies[i] = time.perf_counter() - start
+
+    exact_peak = reset_peak_rss()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(count)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    errors = sum(1 for status in statuses if status < 200 or status >= 400)
+    return {
+        "requests": count, "concurrency": concurrency, "errors": errors,
+        "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)), "mean_ms": float(ms.mean()), "max_ms": float(ms.max()),
+        "throughput_rps": count / elapsed, "peak_rss_mb": peak_rss_mb(), "peak_rss_per_phase": exact_peak
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline['meta']['commit']} ({baseline_path})")
+    print(f"{'endpoint':<10} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>9}")
+    for endpoint, current in results["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if before is None:
+            continue
+        change = {key: (current[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+                  for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")}
+        print(f"{endpoint:<10} {change['p50_ms']:>+8.1f}% {change['p95_ms']:>+8.1f}% "
+              f"{change['p99_ms']:>+8.1f}% {change['throughput_rps']:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the StyleStack API with synthetic users and wardrobes")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--wardrobe-size", type=int, default=200, help="items seeded per user")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--target", choices=["testclient", "server"], default="testclient",
+                        help="Flask test client in-process, or a local threaded HTTP server")
+    parser.add_argument("--model", choices=["fake", "resnet50"], default="fake",
+                        help="deterministic fake image model, or the real ResNet50")
+    parser.add_argument("--fake-call-ms", type=float, default=0.0, help="simulated cost per fake model call")
+    parser.add_argument("--fake-image-ms", type=float, default=0.0, help="simulated cost per image in a call")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[1200, 900], metavar=("HEIGHT", "WIDTH"))
+    parser.add_argument("--duplicate-uploads", action="store_true",
+                        help="reuse 8 images so uploads hit the classification cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default loadtest-<commit>.json in the system temp dir)")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the seeded database and uploads")
+    parser.add_argument("--compare", help="earlier results file to print relative changes against")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    cwd = os.getcwd()
+    output = os.path.abspath(args.output or os.path.join(tempfile.gettempdir(), f"loadtest-{git_commit()}.json"))
+    weather_server, weather_url = start_weather_stub()
+    workdir = tempfile.mkdtemp(prefix="stylestack-load-")
+    os.environ.update(WEATHER_API_URL=weather_url, MODEL_WARMUP="0", TF_CPP_MIN_LOG_LEVEL="3")
+    os.chdir(workdir)
+    try:
+        run(args, cwd, output, workdir)
+    finally:
+        weather_server.shutdown()
+        os.chdir(cwd)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args, cwd, output, workdir):
+    sys.path.insert(0, ROOT)
+    import app as stylestack
+    from model_loader import LazyModel
+
+    stylestack.logger.setLevel("WARNING")
+    dim = 2048
+    if args.model == "fake":
+        stylestack.image_model = LazyModel("image_model", lambda: FakeImageModel(
+            dim, args.fake_call_ms, args.fake_image_ms, args.seed))
+    stylestack.image_model.get()
+    stylestack.chatbot_model.get()
+
+    users = seed_users(stylestack, args.users, args.wardrobe_size, dim, args.seed)
+    target = ServerTarget(stylestack.app) if args.target == "server" else TestClientTarget(stylestack.app)
+    rng = np.random.default_rng(args.seed)
+
+    results = {
+        "meta": {
+            "commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "args": vars(args), "workdir": workdir
+        },
+        "endpoints": {}
+    }
+    print(f"{args.users} users x {args.wardrobe_size} items, {args.requests} requests per endpoint at "
+          f"concurrency {args.concurrency} ({args.target}, {args.model} model)")
+    print(f"{'endpoint':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7} {'peak MB':>8}")
+    for endpoint in args.endpoints:
+        make_request = make_requests(endpoint, users, rng, tuple(args.image_size), not args.duplicate_uploads)
+        r = run_endpoint(target, make_request, args.requests, args.concurrency)
+        results["endpoints"][endpoint] = r
+        print(f"{endpoint:<10} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['throughput_rps']:>8.1f} {r['errors']:>7} {r['peak_rss_mb']:>8.0f}")
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"saved {output}")
+    if args.compare:
+        compare(results, os.path.join(cwd, args.compare))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    # Thread-safe LRU cache whose entries expire after ttl seconds. Expired
+    # entries are kept until LRU eviction so get_or_load can fall back to them
+    # when the loader fails. Concurrent misses for one key share one load.
+    # With error_ttl, a failed load caches what it served (the stale entry or
+    # the caller's fallback) for error_ttl seconds, so a failing backend is
+    # retried once per key per error_ttl rather than on every lookup.
+    def __init__(self, maxsize=128, ttl=600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.stale_served = 0
+        self.fallback_served = 0
+        self.errors_cached = 0
+
+    def _fresh(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= self.clock():
+            return _MISSING
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._fresh(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def _set(self, key, value, ttl=None):
+        self._data[key] = (value, self.clock() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def discard_where(self, predicate):
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_or_load(self, key, loader, ttl=None, fallback=_MISSING, error_ttl=None):
+        with self._lock:
+            value = self._fresh(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            with self._lock:
+                self._set(key, flight.value, ttl)
+            return flight.value
+        except Exception as e:
+            with self._lock:
+                entry = self._data.get(key)
+                if entry is not None:
+                    self.stale_served += 1
+                    flight.value = entry[0]
+                elif fallback is not _MISSING:
+                    self.fallback_served += 1
+                    flight.value = fallback
+                else:
+                    flight.error = e
+                    raise
+                if error_ttl is not None:
+                    self.errors_cached += 1
+                    self._set(key, flight.value, error_ttl)
+                return flight.value
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "stale_served": self.stale_served,
+                "fallback_served": self.fallback_served,
+                "errors_cached": self.errors_cached,
+            }
@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import threading
+from collections import defaultdict
+
+from file_lock import locked
+
+
+class ChatLog:
+    # Per-user chat history as an append-only log of JSON Lines segments,
+    # <root>/<user_id>/<first seq>.jsonl. An append writes one line per
+    # message to the newest segment and starts a new segment once it holds
+    # segment_size messages. Seqs within a segment are contiguous, so the
+    # newest segment's name and its last line give the next seq.
+    #
+    # Retention: an append with a limit records the first retained seq in
+    # <root>/<user_id>/retained and every read skips older messages, so
+    # exactly `limit` messages are visible. Files only shrink by compaction
+    # once a whole segment has expired: expired segments are deleted and the
+    # one straddling the cut is rewritten.
+    #
+    # Nothing about a log is cached between calls; appends take a per-user
+    # file lock and re-read the log's tail, so worker processes sharing the
+    # directory never hand out the same seq. Reads walk segments
+    # newest-first and stop once a page is full.
+    def __init__(self, root, segment_size=256):
+        self.root = root
+        self.segment_size = segment_size
+        os.makedirs(root, exist_ok=True)
+        self._locks = defaultdict(threading.RLock)
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, user_id):
+        with self._locks_guard:
+            return self._locks[user_id]
+
+    def _dir(self, user_id):
+        return os.path.join(self.root, user_id)
+
+    def _segment_path(self, user_id, start):
+        return os.path.join(self._dir(user_id), f"{start:012d}.jsonl")
+
+    def _retained_path(self, user_id):
+        return os.path.join(self._dir(user_id), "retained")
+
+    def _read_segment(self, user_id, start):
+        with open(self._segment_path(user_id, start), 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _segments(self, user_id):
+        try:
+            names = os.listdir(self._dir(user_id))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-6]) for name in names if name.endswith('.jsonl'))
+
+    def _retained_from(self, user_id):
+        try:
+            with open(self._retained_path(user_id), 'r') as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _next_seq(self, user_id, segments):
+        # Reads only the last line of the newest segment
+        if not segments:
+            return 0
+        with open(self._segment_path(user_id, segments[-1]), 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            position, tail = end, b""
+            while position > 0 and tail.rstrip(b"\n").count(b"\n") == 0:
+                position = max(0, position - 4096)
+                f.seek(position)
+                tail = f.read(end - position)
+        lines = tail.rstrip(b"\n").split(b"\n")
+        if not lines[-1].strip():
+            return segments[-1]
+        return json.loads(lines[-1])["seq"] + 1
+
+    def exists(self, user_id):
+        return bool(self._segments(user_id))
+
+    def append(self, user_id, entries, limit=None):
+        os.makedirs(self._dir(user_id), exist_ok=True)
+        with self._lock(user_id), locked(os.path.join(self.root, f"{user_id}.lock")):
+            segments = self._segments(user_id)
+            next_seq = self._next_seq(user_id, segments)
+            lines = []
+            for entry in entries:
+                if not segments or next_seq - segments[-1] >= self.segment_size:
+                    self._write_lines(user_id, segments, lines)
+                    lines = []
+                    segments.append(next_seq)
+                lines.append(json.dumps({**entry, "seq": next_seq}))
+                next_seq += 1
+            self._write_lines(user_id, segments, lines)
+            if limit is not None and next_seq - limit > self._retained_from(user_id):
+                cut = next_seq - limit
+                tmp_path = f"{self._retained_path(user_id)}.tmp"
+                with open(tmp_path, 'w') as f:
+                    f.write(str(cut))
+                os.replace(tmp_path, self._retained_path(user_id))
+                if len(segments) > 1 and segments[1] <= cut:
+                    self._compact(user_id, segments, cut)
+
+    def _write_lines(self, user_id, segments, lines):
+        if lines:
+            with open(self._segment_path(user_id, segments[-1]), 'a') as f:
+                f.write("\n".join(lines) + "\n")
+
+    def _compact(self, user_id, segments, cut):
+        while len(segments) > 1 and segments[1] <= cut:
+            os.remove(self._segment_path(user_id, segments.pop(0)))
+        first = segments[0]
+        if first < cut and len(segments) > 1:
+            kept = [entry for entry in self._read_segment(user_id, first) if entry["seq"] >= cut]
+            path = self._segment_path(user_id, cut)
+            with open(f"{path}.tmp", 'w') as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in kept))
+            os.replace(f"{path}.tmp", path)
+            os.remove(self._segment_path(user_id, first))
+            segments[0] = cut
+
+    def history(self, user_id, before=None, limit=50):
+        # Up to limit messages older than seq `before` (newest if None), oldest
+        # first, plus the `before` value for the previous page or None
+        segments = self._segments(user_id)
+        retained = self._retained_from(user_id)
+        page = []
+        for start in reversed(segments):
+            if before is not None and start >= before:
+                continue
+            try:
+                entries = self._read_segment(user_id, start)
+            except FileNotFoundError:
+                break  # compacted away while reading
+            entries = [entry for entry in entries
+                       if entry["seq"] >= retained and (before is None or entry["seq"] < before)]
+            page = entries + page
+            if len(page) >= limit or start <= retained:
+                break
+        page = page[-limit:] if limit else []
+        more = bool(page) and page[0]["seq"] > max(segments[0], retained)
+        return page, page[0]["seq"] if more else None
+
+    def all(self, user_id):
+        retained = self._retained_from(user_id)
+        entries = []
+        for start in self._segments(user_id):
+            try:
+                entries.extend(entry for entry in self._read_segment(user_id, start) if entry["seq"] >= retained)
+            except FileNotFoundError:
+                continue  # compacted away while reading
+        return entries
+
+    def replace(self, user_id, entries, limit=None):
+        with self._lock(user_id), locked(os.path.join(self.root, f"{user_id}.lock")):
+            shutil.rmtree(self._dir(user_id), ignore_errors=True)
+        self.append(user_id, [{k: v for k, v in entry.items() if k != "seq"} for entry in entries], limit)
@@ -0,0 +1,150 @@
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Reference swatches for the colour names the app already uses. A name can
+# have several swatches (navy and royal blue are both "blue").
+NAMED_COLORS = [
+    ("black", (20, 20, 20)),
+    ("white", (245, 245, 245)),
+    ("gray", (128, 128, 128)),
+    ("gray", (190, 190, 190)),
+    ("gray", (75, 75, 75)),
+    ("red", (200, 30, 30)),
+    ("red", (130, 20, 30)),
+    ("green", (40, 160, 60)),
+    ("green", (30, 90, 40)),
+    ("green", (110, 130, 60)),
+    ("blue", (30, 70, 200)),
+    ("blue", (25, 35, 90)),
+    ("blue", (100, 150, 220)),
+    ("yellow", (240, 220, 50)),
+    ("orange", (240, 140, 30)),
+    ("purple", (120, 50, 150)),
+    ("purple", (180, 130, 210)),
+    ("pink", (240, 150, 180)),
+    ("pink", (220, 60, 140)),
+]
+
+
+def rgb_to_lab(rgb):
+    # sRGB (0-255, any leading shape) -> CIE Lab under D65
+    rgb = np.asarray(rgb, dtype=np.float32) / 255.0
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    return np.stack([
+        116.0 * f[..., 1] - 16.0,
+        500.0 * (f[..., 0] - f[..., 1]),
+        200.0 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+class ColorExtractor:
+    # Dominant colour naming without k-means: the image is shrunk to at most
+    # max_side pixels, an optional border-based mask drops the background, and
+    # every remaining pixel is assigned to its nearest named swatch in Lab
+    # space. Votes per name give a ranked palette.
+    def __init__(self, max_side=64, mask_background=True, palette=NAMED_COLORS,
+                 max_distance=45.0, background_distance=12.0, min_share=0.05, decode_reduction=4):
+        self.max_side = max_side
+        self.mask_background = mask_background
+        self.max_distance = max_distance
+        self.background_distance = background_distance
+        self.min_share = min_share
+        self.decode_reduction = decode_reduction
+        self.names = sorted({name for name, _ in palette})
+        self._swatch_names = np.array([self.names.index(name) for name, _ in palette])
+        self._swatch_lab = rgb_to_lab(np.array([rgb for _, rgb in palette], dtype=np.float32))
+
+    def load(self, img_path):
+        # JPEG/PNG decoders can skip work when asked for a reduced image
+        flags = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                 8: cv2.IMREAD_REDUCED_COLOR_8}.get(self.decode_reduction, cv2.IMREAD_COLOR)
+        img = cv2.imread(img_path, flags)
+        if img is not None and flags != cv2.IMREAD_COLOR and max(img.shape[:2]) < self.max_side:
+            img = cv2.imread(img_path, cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    def downsample(self, rgb):
+        height, width = rgb.shape[:2]
+        scale = self.max_side / max(height, width)
+        if scale >= 1:
+            return rgb
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)
+
+    def _foreground(self, lab):
+        # Treat pixels close to the median border colour as background
+        pixels = lab.reshape(-1, 3)
+        if not self.mask_background or min(lab.shape[:2]) < 4:
+            return pixels
+        border = np.concatenate([lab[0], lab[-1], lab[1:-1, 0], lab[1:-1, -1]])
+        background = np.median(border, axis=0)
+        keep = np.linalg.norm(pixels - background, axis=1) > self.background_distance
+        # Garment fills the frame (or is the same colour as the backdrop)
+        if keep.mean() < 0.1:
+            return pixels
+        return pixels[keep]
+
+    def _pixels(self, rgb):
+        return self._foreground(rgb_to_lab(self.downsample(rgb)))
+
+    def _assign(self, pixels):
+        distances = ((pixels[:, None, :] - self._swatch_lab[None, :, :]) ** 2).sum(axis=2)
+        nearest = distances.argmin(axis=1)
+        labels = self._swatch_names[nearest]
+        too_far = distances[np.arange(len(pixels)), nearest] > self.max_distance ** 2
+        labels[too_far] = len(self.names)  # "other"
+        return labels
+
+    def _rank(self, counts, top):
+        total = counts.sum()
+        if total == 0:
+            return []
+        names = self.names + ["other"]
+        order = np.argsort(-counts, kind='stable')
+        palette = [
+            {"name": names[i], "share": float(counts[i] / total)}
+            for i in order if counts[i] > 0 and counts[i] / total >= self.min_share
+        ]
+        return palette[:top] if top else palette
+
+    def palette(self, rgb, top=3):
+        pixels = self._pixels(rgb)
+        counts = np.bincount(self._assign(pixels), minlength=len(self.names) + 1)
+        return self._rank(counts, top)
+
+    def palette_batch(self, images, top=3):
+        # One vectorised assignment over the pixels of every image
+        prepared = [self._pixels(rgb) if rgb is not None else np.zeros((0, 3), np.float32) for rgb in images]
+        if not prepared:
+            return []
+        owners = np.repeat(np.arange(len(prepared)), [len(p) for p in prepared])
+        labels = self._assign(np.concatenate(prepared))
+        bins = len(self.names) + 1
+        counts = np.bincount(owners * bins + labels, minlength=len(prepared) * bins).reshape(len(prepared), bins)
+        return [self._rank(row, top) for row in counts]
+
+    def extract(self, image, top=1):
+        rgb = self.load(image) if isinstance(image, str) else image
+        if rgb is None:
+            return ["unknown"]
+        return [entry["name"] for entry in self.palette(rgb, top)] or ["unknown"]
+
+    def extract_batch(self, images, top=1):
+        decoded = [self.load(image) if isinstance(image, str) else image for image in images]
+        return [
+            [entry["name"] for entry in palette] or ["unknown"]
+            for palette in self.palette_batch(decoded, top)
+        ]
@@ -0,0 +1,240 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from file_lock import locked
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ClassificationCache:
+    # Image-derived classification (colours and embedding) keyed by the
+    # SHA-256 of the upload, one JSON file per entry (<digest>.json) under a
+    # directory named after the model configuration, so changing the model
+    # never serves old results. Entries are evicted least-recently-used once
+    # the files exceed max_bytes. Perceptual hashes are stored in each entry
+    # and appended to a side index (phashes.txt), so the near-duplicate index
+    # is rebuilt at startup without reading any entry, and an exact lookup
+    # for an entry another worker wrote is a single stat.
+    def __init__(self, root, namespace="", max_bytes=256 * 1024 * 1024, max_distance=0):
+        self.root = os.path.join(root, hashlib.sha1(namespace.encode()).hexdigest()[:12])
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, "phashes.txt")
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> (size, phash)
+        self._bytes = 0
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scan()
+
+    def _path(self, digest):
+        return os.path.join(self.root, f"{digest}.json")
+
+    def _scan(self):
+        found = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".json") and entry.name.count(".") == 1:
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        with locked(f"{self._index_path}.lock"):
+            phashes = {}
+            try:
+                with open(self._index_path, 'r') as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) == 2:
+                            phashes[parts[0]] = int(parts[1], 16)
+            except FileNotFoundError:
+                pass
+            for _, digest, size in sorted(found):
+                self._entries[digest] = (size, phashes.get(digest))
+                self._bytes += size
+            # Drop index lines of evicted entries
+            tmp_path = f"{self._index_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write("".join(f"{digest} {phash:016x}\n" for digest, (_, phash) in self._entries.items()
+                                if phash is not None))
+            os.replace(tmp_path, self._index_path)
+
+    def _find(self, digest):
+        entry = self._entries.get(digest)
+        if entry is not None:
+            return entry
+        # Written by another worker process sharing the directory; its phash
+        # is filled in from the entry by _read
+        try:
+            size = os.path.getsize(self._path(digest))
+        except OSError:
+            return None
+        entry = self._entries[digest] = (size, None)
+        self._bytes += size
+        return entry
+
+    def _read(self, digest, entry):
+        path = self._path(digest)
+        try:
+            with open(path, 'r') as f:
+                stored = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self._forget(digest)
+            return None
+        if entry[1] is None and stored.get("phash"):
+            self._entries[digest] = (entry[0], int(stored["phash"], 16))
+        self._entries.move_to_end(digest)
+        result = {"colors": stored["colors"]}
+        if stored.get("embedding"):
+            vector = np.frombuffer(base64.b64decode(stored["embedding"]), dtype=np.float16)
+            result["embedding"] = vector.astype(np.float32).tolist()
+        return result
+
+    def _forget(self, digest):
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            self._bytes -= entry[0]
+        return entry
+
+    def _nearest(self, phash):
+        best, best_distance = None, self.max_distance + 1
+        for digest, (_, other) in self._entries.items():
+            if other is not None:
+                distance = bin(phash ^ other).count("1")
+                if distance < best_distance:
+                    best, best_distance = digest, distance
+        return best
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._find(digest)
+            result = self._read(digest, entry) if entry is not None else None
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def get_near(self, phash):
+        # Second chance after an exact miss; near_hits count misses rescued
+        if self.max_distance <= 0:
+            return None
+        with self._lock:
+            near = self._nearest(phash)
+            result = self._read(near, self._entries[near]) if near is not None else None
+            if result is not None:
+                self.near_hits += 1
+            return result
+
+    def set(self, digest, result, phash=None):
+        stored = {"colors": result.get("colors", [])}
+        if result.get("embedding"):
+            stored["embedding"] = base64.b64encode(np.asarray(result["embedding"], dtype=np.float16).tobytes()).decode()
+        if phash is not None:
+            stored["phash"] = format(phash, '016x')
+        path = self._path(digest)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, path)
+        if phash is not None:
+            with locked(f"{self._index_path}.lock"), open(self._index_path, 'a') as f:
+                f.write(f"{digest} {phash:016x}\n")
+        with self._lock:
+            self._forget(digest)
+            size = os.path.getsize(path)
+            self._entries[digest] = (size, phash)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_digest, (old_size, _) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self._remove(old_digest)
+                self.evictions += 1
+
+    def _remove(self, digest):
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "near_hits": self.near_hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0
+            }
+
+
+class UploadStore:
+    # Stores each distinct upload once, as .blobs/<sha256>, and gives every
+    # item its own name in the upload folder as a hard link to that blob. The
+    # blob's link count is the reference count: releasing an item removes its
+    # link, and the blob goes once no item links to it. Works across worker
+    # processes without any shared bookkeeping. Where hard links aren't
+    # supported the item gets a plain copy instead.
+    def __init__(self, folder):
+        self.folder = folder
+        self.blob_folder = os.path.join(folder, ".blobs")
+        os.makedirs(self.blob_folder, exist_ok=True)
+        self.stored = 0
+        self.deduplicated = 0
+        self.released = 0
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_folder, digest)
+
+    def save(self, path, data, digest=None):
+        digest = digest or content_hash(data)
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            self.deduplicated += 1
+        else:
+            tmp_path = f"{blob}.{threading.get_ident()}.{time.monotonic_ns()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, blob)
+            self.stored += 1
+        try:
+            os.link(blob, path)
+        except OSError:
+            shutil.copyfile(blob, path)
+        return digest
+
+    def release(self, path, digest=None):
+        # Returns True if the content itself was deleted
+        if os.path.exists(path):
+            os.remove(path)
+        if digest is None:
+            return True
+        blob = self.blob_path(digest)
+        try:
+            if os.stat(blob).st_nlink <= 1:
+                os.remove(blob)
+                self.released += 1
+                return True
+        except FileNotFoundError:
+            return True
+        return False
+
+    def stats(self):
+        blobs = [entry for entry in os.scandir(self.blob_folder) if not entry.name.endswith(".tmp")]
+        return {
+            "blobs": len(blobs), "bytes": sum(entry.stat().st_size for entry in blobs),
+            "stored": self.stored, "deduplicated": self.deduplicated, "released": self.released
+        }
@@ -0,0 +1,212 @@
+import argparse
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from image_pipeline import resnet_preprocess
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend(ABC):
+    # One image embedding model behind a common interface: preprocess() turns
+    # an input_size x input_size RGB array into model input, load() builds the
+    # model, predict_on_batch() maps a batch of model inputs to pooled feature
+    # vectors. TensorFlow is only imported by load().
+    name = None
+    input_size = 224
+    dim = None
+
+    @property
+    def input_shape(self):
+        return (self.input_size, self.input_size, 3)
+
+    @abstractmethod
+    def preprocess(self, rgb):
+        pass
+
+    @abstractmethod
+    def load(self):
+        pass
+
+    @abstractmethod
+    def predict_on_batch(self, batch):
+        pass
+
+
+def load_resnet50(weights='imagenet'):
+    # 'none' builds the network with random weights (benchmarks, offline hosts)
+    from tensorflow.keras.applications import ResNet50
+    return ResNet50(weights=None if weights == 'none' else weights, include_top=False, pooling='avg')
+
+
+class KerasBackend(EmbeddingBackend):
+    # A tf.keras application model with global average pooling; subclasses
+    # say how to build it and how to preprocess its input
+    def __init__(self, weights='imagenet'):
+        self.weights = weights
+        self.model = None
+
+    @abstractmethod
+    def build(self):
+        pass
+
+    def load(self):
+        self.model = self.build()
+        return self
+
+    def predict_on_batch(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class ResNet50Backend(KerasBackend):
+    name = "resnet50"
+    dim = 2048
+
+    def preprocess(self, rgb):
+        return resnet_preprocess(rgb)
+
+    def build(self):
+        return load_resnet50(self.weights)
+
+
+class MobileNetV2Backend(KerasBackend):
+    # About 14x fewer multiply-adds and 1/7 of the weights of ResNet50
+    name = "mobilenet_v2"
+    dim = 1280
+
+    def preprocess(self, rgb):
+        return rgb.astype(np.float32) / 127.5 - 1.0
+
+    def build(self):
+        from tensorflow.keras.applications import MobileNetV2
+        weights = None if self.weights == 'none' else self.weights
+        return MobileNetV2(weights=weights, include_top=False, pooling='avg', input_shape=self.input_shape)
+
+
+class TFLiteBackend(EmbeddingBackend):
+    # Int8-quantised TFLite copy of another backend. Weights are always int8;
+    # converting with calibration images also quantises activations. A model
+    # missing from model_path is converted from the base backend on first load
+    # (weights only) and written there for the next start.
+    def __init__(self, base, model_path, num_threads=None):
+        self.base = base
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.name = f"tflite_int8:{base.name}"
+        self.input_size = base.input_size
+        self.dim = base.dim
+        self._interpreter = None
+        self._lock = threading.Lock()
+
+    def preprocess(self, rgb):
+        return self.base.preprocess(rgb)
+
+    def load(self):
+        if not os.path.exists(self.model_path):
+            logger.info(f"Converting {self.base.name} to int8 TFLite at {self.model_path}")
+            convert_to_tflite(self.base, self.model_path)
+        interpreter = _interpreter_class()(model_path=self.model_path, num_threads=self.num_threads)
+        # Keras models built without a fixed input size convert to 1x1 inputs
+        interpreter.resize_tensor_input(interpreter.get_input_details()[0]["index"], (1,) + self.input_shape)
+        interpreter.allocate_tensors()
+        self._input = interpreter.get_input_details()[0]
+        self._output = interpreter.get_output_details()[0]
+        self._interpreter = interpreter
+        return self
+
+    def _quantize(self, x, details):
+        scale, zero_point = details["quantization"]
+        if details["dtype"] == np.float32 or not scale:
+            return x.astype(details["dtype"])
+        info = np.iinfo(details["dtype"])
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(details["dtype"])
+
+    def _dequantize(self, y, details):
+        scale, zero_point = details["quantization"]
+        if details["dtype"] == np.float32 or not scale:
+            return y.astype(np.float32)
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def predict_on_batch(self, batch):
+        # The interpreter runs one image per invoke; resizing its input for
+        # every batch size would reallocate all tensors
+        outputs = []
+        with self._lock:
+            for x in np.asarray(batch, dtype=np.float32):
+                self._interpreter.set_tensor(self._input["index"], self._quantize(x[None], self._input))
+                self._interpreter.invoke()
+                outputs.append(self._dequantize(self._interpreter.get_tensor(self._output["index"]), self._output)[0])
+        return np.stack(outputs)
+
+
+def _interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+def convert_to_tflite(base, output_path, calibration_images=()):
+    # calibration_images: RGB arrays of input_size, ideally real uploads
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(base.build())
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if len(calibration_images):
+        def representative_data():
+            for rgb in calibration_images:
+                yield [base.preprocess(rgb)[None].astype(np.float32)]
+        converter.representative_dataset = representative_data
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(converter.convert())
+    os.replace(tmp_path, output_path)
+
+
+BACKENDS = {"resnet50": ResNet50Backend, "mobilenet_v2": MobileNetV2Backend}
+
+
+def create_backend(name, weights='imagenet', tflite_path=None, tflite_base='resnet50'):
+    if name == 'tflite_int8':
+        if tflite_base not in BACKENDS:
+            raise ValueError(f"Unknown TFLite base backend: {tflite_base}")
+        path = tflite_path or os.path.join('database', 'models', f"{tflite_base}-int8.tflite")
+        return TFLiteBackend(BACKENDS[tflite_base](weights), path)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    return BACKENDS[name](weights)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Convert an embedding backend to an int8 TFLite model")
+    parser.add_argument("--base", choices=sorted(BACKENDS), default="resnet50")
+    parser.add_argument("--weights", default="imagenet")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--calibration-dir", help="images used to also quantise activations (full int8)")
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    args = parser.parse_args()
+
+    from image_pipeline import ImagePipeline
+    base = BACKENDS[args.base](args.weights)
+    pipeline = ImagePipeline(model_size=base.input_size)
+    images = []
+    if args.calibration_dir:
+        for name in sorted(os.listdir(args.calibration_dir))[:args.calibration_limit]:
+            path = os.path.join(args.calibration_dir, name)
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    rgb = pipeline.decode(f.read())
+                if rgb is not None:
+                    images.append(pipeline.model_input(rgb))
+    convert_to_tflite(base, args.output, images)
+    logger.info(f"Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB, "
+                f"{'full int8' if images else 'int8 weights'})")
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from file_lock import locked
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    # Per-user embedding matrix kept on disk as raw float16 rows
+    # (<user_id>.f16), the row -> item id order as one id per line
+    # (<user_id>.ids) and a small header (<user_id>.json) with the dimension
+    # and a generation that every write bumps. Rows are
+    # L2-normalised on write so cosine similarity is a single dot product.
+    # Appends write one row and one line; deletes move the last row into the
+    # freed slot and rewrite only the id list. The vectors file never shrinks
+    # (rows past the id count are unused), so a reader's memory map can't
+    # point past its end while another worker deletes.
+    #
+    # Writes hold a per-user file lock and re-read the id list first, so
+    # several worker processes can write the same user. Reads notice other
+    # processes' writes by the header's generation and reload the ids.
+    dtype = np.float16
+    chunk_rows = 1024  # rows converted to float32 at a time when scoring
+
+    def __init__(self, root, max_cached_users=8):
+        self.root = root
+        self.max_cached_users = max_cached_users
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._meta = {}
+        self._views = OrderedDict()
+
+    def _vectors_path(self, user_id):
+        return os.path.join(self.root, f"{user_id}.f16")
+
+    def _ids_path(self, user_id):
+        return os.path.join(self.root, f"{user_id}.ids")
+
+    def _meta_path(self, user_id):
+        return os.path.join(self.root, f"{user_id}.json")
+
+    def _row_bytes(self, meta):
+        return meta["dim"] * np.dtype(self.dtype).itemsize
+
+    def _read_header(self, user_id):
+        try:
+            with open(self._meta_path(user_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"dim": None, "generation": 0}
+
+    def _replace(self, path, text):
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _write_header(self, user_id, meta):
+        meta["generation"] += 1
+        self._replace(self._meta_path(user_id), json.dumps({"dim": meta["dim"], "generation": meta["generation"]}))
+
+    def _load_meta(self, user_id):
+        header = self._read_header(user_id)
+        meta = self._meta.get(user_id)
+        if meta is not None and meta["generation"] == header.get("generation", 0):
+            return meta
+        if os.path.exists(self._ids_path(user_id)):
+            with open(self._ids_path(user_id), 'r') as f:
+                ids = f.read().splitlines()
+        else:
+            ids = []
+        meta = {"dim": header["dim"], "generation": header.get("generation", 0), "ids": ids,
+                "rows": {item_id: i for i, item_id in enumerate(ids)}}
+        self._meta[user_id] = meta
+        self._views.pop(user_id, None)
+        return meta
+
+    def _write_row(self, user_id, meta, row, vector):
+        path = self._vectors_path(user_id)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(row * self._row_bytes(meta))
+            f.write(vector.tobytes())
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return vector
+
+    def add(self, user_id, item_id, embedding):
+        vector = self._normalize(embedding)
+        if vector.size == 0:
+            return False
+        with self._lock, locked(os.path.join(self.root, f"{user_id}.lock")):
+            meta = self._load_meta(user_id)
+            if meta["dim"] is None or not meta["ids"]:
+                meta["dim"] = int(vector.size)
+            elif vector.size != meta["dim"]:
+                logger.warning(f"Embedding for {item_id} has dim {vector.size}, store expects {meta['dim']}")
+                return False
+            row = meta["rows"].get(item_id)
+            # The row is written before its id, so readers never see an id
+            # without its vector
+            self._write_row(user_id, meta, len(meta["ids"]) if row is None else row, vector.astype(self.dtype))
+            if row is None:
+                with open(self._ids_path(user_id), 'a') as f:
+                    f.write(f"{item_id}\n")
+                meta["rows"][item_id] = len(meta["ids"])
+                meta["ids"].append(item_id)
+                self._views.pop(user_id, None)
+            self._write_header(user_id, meta)
+            return True
+
+    def remove(self, user_id, item_id):
+        with self._lock, locked(os.path.join(self.root, f"{user_id}.lock")):
+            meta = self._load_meta(user_id)
+            row = meta["rows"].pop(item_id, None)
+            if row is None:
+                return False
+            last = len(meta["ids"]) - 1
+            if row != last:
+                row_bytes = self._row_bytes(meta)
+                with open(self._vectors_path(user_id), 'r+b') as f:
+                    f.seek(last * row_bytes)
+                    moved = f.read(row_bytes)
+                    f.seek(row * row_bytes)
+                    f.write(moved)
+                moved_id = meta["ids"][last]
+                meta["ids"][row] = moved_id
+                meta["rows"][moved_id] = row
+            meta["ids"].pop()
+            self._replace(self._ids_path(user_id), "".join(f"{item_id}\n" for item_id in meta["ids"]))
+            self._write_header(user_id, meta)
+            self._views.pop(user_id, None)
+            return True
+
+    def _view(self, user_id, meta):
+        # Read-only float16 memory map of the live rows, kept for a few
+        # recent users; the page cache holds the data, not this process
+        view = self._views.get(user_id)
+        if view is not None:
+            self._views.move_to_end(user_id)
+            return view
+        count = len(meta["ids"])
+        if count == 0:
+            return np.zeros((0, meta["dim"] or 0), dtype=self.dtype)
+        available = os.path.getsize(self._vectors_path(user_id)) // self._row_bytes(meta)
+        if available < count:
+            logger.warning(f"Embedding file for {user_id} has {available} rows, expected {count}")
+            count = available
+        view = np.memmap(self._vectors_path(user_id), dtype=self.dtype, mode='r', shape=(count, meta["dim"]))
+        self._views[user_id] = view
+        while len(self._views) > self.max_cached_users:
+            self._views.popitem(last=False)
+        return view
+
+    def get(self, user_id, item_id):
+        with self._lock:
+            meta = self._load_meta(user_id)
+            row = meta["rows"].get(item_id)
+            view = self._view(user_id, meta)
+            if row is None or row >= len(view):
+                return None
+            return np.asarray(view[row], dtype=np.float32)
+
+    def lookup(self, user_id):
+        # item_id -> float32 vector or None, from one snapshot of the store;
+        # for callers fetching many items at once
+        with self._lock:
+            meta = self._load_meta(user_id)
+            rows = dict(meta["rows"])  # add/remove change meta["rows"] in place
+            view = self._view(user_id, meta)
+
+        def get(item_id):
+            row = rows.get(item_id)
+            if row is None or row >= len(view):
+                return None
+            return np.asarray(view[row], dtype=np.float32)
+        return get
+
+    def similar(self, user_id, item_id, k=5):
+        with self._lock:
+            meta = self._load_meta(user_id)
+            row = meta["rows"].get(item_id)
+            ids = list(meta["ids"])
+            view = self._view(user_id, meta)
+        if row is None or row >= len(view):
+            return None
+        query = np.asarray(view[row], dtype=np.float32)
+        scores = np.empty(len(view), dtype=np.float32)
+        for start in range(0, len(view), self.chunk_rows):
+            chunk = view[start:start + self.chunk_rows]
+            scores[start:start + len(chunk)] = chunk.astype(np.float32) @ query
+        scores[row] = -np.inf
+        k = max(0, min(k, len(scores) - 1))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top]
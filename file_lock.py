@@ -0,0 +1,23 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no multi-process servers there, thread locks suffice
+    fcntl = None
+
+
+@contextmanager
+def locked(path):
+    # Exclusive advisory lock on `path` (created if missing) shared by every
+    # process on the host, e.g. gunicorn workers writing the same user's
+    # files. Not reentrant; hold the caller's thread lock around it.
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
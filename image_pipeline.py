@@ -0,0 +1,63 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# ImageNet channel means in BGR order, as used by Keras' ResNet50 ("caffe") preprocessing
+RESNET_MEAN_BGR = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+
+def resnet_preprocess(rgb):
+    # Same result as tensorflow.keras.applications.resnet50.preprocess_input
+    # without importing TensorFlow in the request path
+    return rgb[..., ::-1].astype(np.float32) - RESNET_MEAN_BGR
+
+
+class ImagePipeline:
+    # Decodes an upload once, straight from its bytes, into an RGB array that
+    # both the embedding model and colour analysis (ColorExtractor downsamples
+    # it further) derive their inputs from.
+    # JPEGs are decoded at the largest 1/2, 1/4 or 1/8 scale that still covers
+    # the model input, so a 12 MP photo never exists at full resolution.
+    def __init__(self, model_size=224):
+        self.model_size = model_size
+
+    def _reduction(self, data):
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                width, height = img.size
+        except Exception:
+            return 1
+        for factor in (8, 4, 2):
+            if min(width, height) // factor >= self.model_size:
+                return factor
+        return 1
+
+    def decode(self, data):
+        flags = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                 8: cv2.IMREAD_REDUCED_COLOR_8}.get(self._reduction(data), cv2.IMREAD_COLOR)
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+        if img is not None:
+            return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        # Formats OpenCV can't read (e.g. GIF) go through Pillow
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                return np.asarray(img.convert("RGB"))
+        except Exception:
+            return None
+
+    def model_input(self, rgb):
+        size = (self.model_size, self.model_size)
+        interpolation = cv2.INTER_AREA if min(rgb.shape[:2]) > self.model_size else cv2.INTER_LINEAR
+        return cv2.resize(rgb, size, interpolation=interpolation)
+
+
+def perceptual_hash(rgb):
+    # 64-bit difference hash: whether each pixel of a 9x8 grey thumbnail is
+    # brighter than its right neighbour. Re-encodes and resizes of the same
+    # photo land within a few bits of each other.
+    grey = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(grey, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
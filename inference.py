@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    __slots__ = ("inputs", "event", "result", "error", "enqueued_at")
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchInferenceEngine:
+    # Collects single-sample requests from many threads and runs them through
+    # predict_fn in one call. A batch is flushed as soon as it reaches
+    # max_batch_size or the oldest request has waited max_wait_ms.
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        self.stats = {"batches": 0, "items": 0, "max_batch": 0, "errors": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="batch-inference", daemon=True)
+                self._thread.start()
+
+    def shutdown(self, timeout=None):
+        with self._lock:
+            thread = self._thread
+            self._stopped = True
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def submit(self, inputs, timeout=None):
+        # inputs is a single sample without the batch axis, e.g. (224, 224, 3)
+        if self._stopped:
+            raise RuntimeError("Inference engine has been shut down")
+        self.start()
+        pending = _PendingRequest(np.asarray(inputs))
+        self._queue.put(pending)
+        if not pending.event.wait(timeout):
+            raise TimeoutError("Timed out waiting for batched inference")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        stop = False
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    pending = self._queue.get(timeout=remaining)
+                else:
+                    pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                stop = True
+                break
+            batch.append(pending)
+        return batch, stop
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stop = self._collect_batch(first)
+            self._process(batch)
+            if stop:
+                break
+
+    def _process(self, batch):
+        try:
+            outputs = self.predict_fn(np.stack([pending.inputs for pending in batch]))
+            for pending, output in zip(batch, outputs):
+                pending.result = output
+        except Exception as e:
+            logger.error(f"Batched inference failed for {len(batch)} requests: {e}")
+            self.stats["errors"] += 1
+            for pending in batch:
+                pending.error = e
+        finally:
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+            for pending in batch:
+                pending.event.set()
+
+
+def warm_up(model, input_shape=(224, 224, 3)):
+    model.predict_on_batch(np.zeros((1,) + tuple(input_shape), dtype=np.float32))
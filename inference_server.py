@@ -0,0 +1,170 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from embedding_backends import BACKENDS, create_backend
+from inference import BatchInferenceEngine, warm_up
+
+logger = logging.getLogger(__name__)
+
+# Wire format, both directions: two big-endian uint32 lengths (JSON header,
+# raw payload) followed by the header and the payload bytes. Arrays travel
+# as raw bytes described by "shape" and "dtype" in the header.
+_LENGTHS = struct.Struct("!II")
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock, header, payload=b""):
+    header_bytes = json.dumps(header).encode()
+    sock.sendall(_LENGTHS.pack(len(header_bytes), len(payload)) + header_bytes)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    header_size, payload_size = _LENGTHS.unpack(_recv_exact(sock, _LENGTHS.size))
+    header = json.loads(_recv_exact(sock, header_size))
+    return header, _recv_exact(sock, payload_size) if payload_size else b""
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    # One thread per worker connection; all of them feed the same batching
+    # engine, so requests from different workers share model calls
+    def handle(self):
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            if header.get("op") == "ping":
+                send_message(self.request, {"ok": True, "backend": self.server.backend})
+                continue
+            try:
+                inputs = np.frombuffer(payload, dtype=header["dtype"]).reshape(header["shape"])
+                result = np.asarray(self.server.engine.submit(inputs), dtype=np.float32)
+                send_message(self.request, {"shape": list(result.shape), "dtype": "float32"}, result.tobytes())
+            except Exception as e:
+                send_message(self.request, {"error": str(e)})
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, predict_fn, max_batch_size=32, max_wait_ms=10, backend=None):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.backend = backend
+        self.engine = BatchInferenceEngine(predict_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        super().__init__(socket_path, _Handler)
+
+
+class InferenceClient:
+    # Keeps one connection per calling thread. After a failed connect the
+    # server is treated as absent for retry_interval seconds, so callers can
+    # fall back to in-process inference without paying a connect per request.
+    # A server running a different embedding backend counts as absent: its
+    # vectors would not be comparable with the ones already stored.
+    def __init__(self, socket_path, timeout=30, retry_interval=5, backend=None):
+        self.socket_path = socket_path
+        self.backend = backend
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._local = threading.local()
+        self._down_until = 0
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            return sock
+        if time.monotonic() < self._down_until:
+            raise ConnectionError("Inference server marked unavailable")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            if self.backend is not None:
+                send_message(sock, {"op": "ping"})
+                header, _ = recv_message(sock)
+                if header.get("backend") != self.backend:
+                    raise ConnectionError(f"Inference server runs {header.get('backend')}, expected {self.backend}")
+        except OSError:
+            sock.close()
+            self._down_until = time.monotonic() + self.retry_interval
+            raise
+        self._local.sock = sock
+        return sock
+
+    def _request(self, header, payload=b""):
+        sock = self._connection()
+        try:
+            send_message(sock, header, payload)
+            return recv_message(sock)
+        except OSError:
+            sock.close()
+            self._local.sock = None
+            self._down_until = time.monotonic() + self.retry_interval
+            raise
+
+    def available(self):
+        try:
+            header, _ = self._request({"op": "ping"})
+            return bool(header.get("ok"))
+        except OSError:
+            return False
+
+    def embed(self, inputs):
+        inputs = np.ascontiguousarray(inputs, dtype=np.float32)
+        header, payload = self._request({"shape": list(inputs.shape), "dtype": "float32"}, inputs.tobytes())
+        if "error" in header:
+            raise RuntimeError(f"Inference server error: {header['error']}")
+        return np.frombuffer(payload, dtype=header["dtype"]).reshape(header["shape"])
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Serve image embeddings to app workers over a Unix socket")
+    parser.add_argument("--socket", default=os.environ.get('INFERENCE_SOCKET', '/tmp/stylestack-inference.sock'))
+    parser.add_argument("--weights", default=os.environ.get('IMAGE_MODEL_WEIGHTS', 'imagenet'))
+    parser.add_argument("--backend", choices=sorted(BACKENDS) + ["tflite_int8"],
+                        default=os.environ.get('EMBEDDING_BACKEND', 'resnet50'))
+    parser.add_argument("--tflite-base", choices=sorted(BACKENDS), default=os.environ.get('TFLITE_BASE', 'resnet50'))
+    parser.add_argument("--tflite-model", default=os.environ.get('TFLITE_MODEL_PATH'))
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    backend = create_backend(args.backend, args.weights, args.tflite_model, args.tflite_base).load()
+    warm_up(backend, backend.input_shape)
+    server = InferenceServer(args.socket, backend.predict_on_batch, args.max_batch_size, args.max_wait_ms,
+                             backend=backend.name)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    logger.info(f"Inference server listening on {args.socket} ({backend.name})")
+    try:
+        server.serve_forever()
+    finally:
+        server.engine.shutdown()
+        os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
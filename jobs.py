@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobQueue:
+    # Bounded background work queue served by a fixed pool of worker threads.
+    # submit() refuses new work once max_pending jobs are waiting so callers
+    # can push back on clients instead of queueing without limit.
+    # With a root directory every state change is also written to
+    # <root>/<job id>.json, so any worker process sharing the directory can
+    # answer get() for jobs another process accepted.
+    def __init__(self, workers=2, max_pending=32, keep_finished=1000, name="jobs", root=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.name = name
+        self.root = root
+        if root is not None:
+            os.makedirs(root, exist_ok=True)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn, *args, **kwargs):
+        # fn is called as fn(progress, *args, **kwargs); progress(stage, fraction)
+        # lets it report where it is
+        self._start()
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "queued",
+            "stage": "queued",
+            "progress": 0.0,
+            "created": datetime.now().isoformat(),
+            "started": None,
+            "finished": None,
+            "result": None,
+            "error": None
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._save(job)
+        try:
+            self._queue.put_nowait((job, fn, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job["id"]]
+                self._discard(job["id"])
+            raise QueueFullError(f"{self.name} queue is full ({self.max_pending} pending)")
+        return dict(job)
+
+    def _path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _save(self, job):
+        if self.root is None:
+            return
+        path = self._path(job["id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _discard(self, job_id):
+        if self.root is None:
+            return
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        if self.root is None:
+            return None
+        try:
+            if str(uuid.UUID(job_id)) != job_id:
+                return None  # only ids submit() made name a file
+        except ValueError:
+            return None
+        # Accepted by another worker process
+        try:
+            with open(self._path(job_id), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+        return {"pending": self.pending(), "running": running, "workers": self.workers, "max_pending": self.max_pending}
+
+    def _update(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+            self._save(job)
+
+    def _forget_finished(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("done", "failed")]
+            for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self._jobs[job_id]
+                self._discard(job_id)
+
+    def _run(self):
+        while True:
+            job, fn, args, kwargs = self._queue.get()
+            self._update(job, status="running", stage="running", started=datetime.now().isoformat())
+
+            def progress(stage, fraction=None):
+                fields = {"stage": stage}
+                if fraction is not None:
+                    fields["progress"] = float(fraction)
+                self._update(job, **fields)
+
+            try:
+                result = fn(progress, *args, **kwargs)
+                self._update(job, status="done", stage="done", progress=1.0, result=result,
+                             finished=datetime.now().isoformat())
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}")
+                self._update(job, status="failed", stage="failed", error=str(e),
+                             finished=datetime.now().isoformat())
+            finally:
+                self._queue.task_done()
+                self._forget_finished()
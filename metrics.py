@@ -0,0 +1,221 @@
+import contextvars
+import functools
+import logging
+import re
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter
+
+# Upper bounds in seconds; covers sub-millisecond cache hits up to slow model loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+trace_id = contextvars.ContextVar("trace_id", default="-")
+
+
+_VALID_TRACE_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def accept_trace_id(value):
+    # An incoming X-Request-ID ends up in every log line, so anything but a
+    # short plain token is replaced with a fresh id
+    if value and _VALID_TRACE_ID.fullmatch(value):
+        return value
+    return new_trace_id()
+
+
+class TraceIdFilter(logging.Filter):
+    # Adds %(trace_id)s to every record; install on handlers, not loggers
+    def filter(self, record):
+        record.trace_id = trace_id.get()
+        return True
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    # Cumulative-bucket histogram per label combination, rendered in the
+    # Prometheus text format. observe() is a bisect and three additions.
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, ([*counts], total, count)) for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                label_text = _format_labels(self.labelnames + ("le",), labels + (_number(bound),))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total!r}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    # Histograms are updated as work happens; collectors are called at scrape
+    # time and return (name, type, help, [(labels dict, value), ...]) tuples
+    # for values that already live elsewhere (cache counters, queue depths).
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(name, help_text, labelnames, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def collector(self, fn):
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        families = {}
+        for collect in self.collectors:
+            try:
+                collected = collect()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Metrics collector {collect.__name__} failed: {e}")
+                continue
+            for name, kind, help_text, samples in collected:
+                families.setdefault(name, (kind, help_text, []))[2].extend(samples)
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+request_seconds = registry.histogram(
+    "stylestack_request_seconds", "HTTP request latency by route", ("method", "route", "status"))
+stage_seconds = registry.histogram(
+    "stylestack_stage_seconds", "Latency of internal stages (storage, decode, predict, ...)", ("stage",))
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stage_seconds.observe(time.perf_counter() - self.start, self.name)
+        return False
+
+
+def stage(name):
+    # with stage("decode"): ...
+    return _Stage(name)
+
+
+def timed(name):
+    # Decorator form of stage()
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Instrumented:
+    # Proxy timing every method call of the wrapped object as "<prefix>.<method>"
+    def __init__(self, target, prefix):
+        self._target = target
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if not callable(value) or name.startswith("_"):
+            return value
+        wrapper = timed(f"{self._prefix}.{name}")(value)
+        self.__dict__[name] = wrapper
+        return wrapper
+
+
+class SamplingProfiler:
+    # Samples one thread's Python stack every `interval` seconds from a
+    # background thread and counts identical stacks. report() returns them
+    # in collapsed-stack format ("outer;inner;leaf count"), which flamegraph
+    # tools read directly. Costs nothing unless started.
+    def __init__(self, thread_id=None, interval=0.005, max_depth=64):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def report(self, top=None):
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common(top))
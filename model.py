@@ -3,16 +3,93 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 import pickle
 import os
+import re
+from collections import Counter
 from datetime import datetime, timedelta
+from functools import lru_cache
+import metrics
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+class CompiledIntentScorer:
+    # The trained TF-IDF vocabulary, idf weights and logistic regression
+    # coefficients exported to plain NumPy arrays. Scoring a query is a sparse
+    # dot product over the handful of vocabulary terms it contains.
+    token_pattern = re.compile(r"(?u)\b\w\w+\b")
+
+    def __init__(self, vectorizer, classifier):
+        params = vectorizer.get_params()
+        expected = {"lowercase": True, "ngram_range": (1, 1), "analyzer": "word", "binary": False,
+                    "sublinear_tf": False, "norm": "l2", "use_idf": True, "stop_words": None,
+                    "strip_accents": None, "preprocessor": None, "tokenizer": None,
+                    "token_pattern": self.token_pattern.pattern}
+        unsupported = [name for name, value in expected.items() if params.get(name) != value]
+        if unsupported:
+            raise ValueError(f"Cannot compile vectorizer with custom {', '.join(unsupported)}")
+
+        self.vocabulary = {term: int(index) for term, index in vectorizer.vocabulary_.items()}
+        self.idf = np.asarray(vectorizer.idf_, dtype=np.float64)
+        self.classes = np.asarray(classifier.classes_)
+        coef = np.asarray(classifier.coef_, dtype=np.float64)
+        intercept = np.asarray(classifier.intercept_, dtype=np.float64)
+        if coef.shape[0] == 1:
+            # Binary model: a single decision function for classes_[1]
+            coef = np.vstack([np.zeros_like(coef), coef])
+            intercept = np.array([0.0, intercept[0]])
+        self.weights = np.ascontiguousarray(coef.T)  # (n_terms, n_classes)
+        self.intercept = intercept
+
+    def _terms(self, query):
+        counts = Counter()
+        for token in self.token_pattern.findall(query.lower()):
+            index = self.vocabulary.get(token)
+            if index is not None:
+                counts[index] += 1
+        return counts
+
+    def scores(self, query):
+        counts = self._terms(query)
+        if not counts:
+            return self.intercept.copy()
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * self.idf[indices]
+        values /= np.sqrt(values @ values)
+        return self.intercept + values @ self.weights[indices]
+
+    def predict(self, query):
+        return self.classes[int(np.argmax(self.scores(query)))]
+
+    def predict_batch(self, queries):
+        rows, indices, values = [], [], []
+        for row, query in enumerate(queries):
+            for index, count in self._terms(query).items():
+                rows.append(row)
+                indices.append(index)
+                values.append(count)
+        scores = np.tile(self.intercept, (len(queries), 1))
+        if rows:
+            rows = np.asarray(rows, dtype=np.int64)
+            indices = np.asarray(indices, dtype=np.int64)
+            values = np.asarray(values, dtype=np.float64) * self.idf[indices]
+            norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(queries)))
+            values /= norms[rows]
+            np.add.at(scores, rows, values[:, None] * self.weights[indices])
+        return self.classes[np.argmax(scores, axis=1)].tolist()
 
 class ChatbotModel:
-    def __init__(self):
+    def __init__(self, actions=None, cache_size=4096):
         self.vectorizer = TfidfVectorizer()
         self.classifier = LogisticRegression()
         self.intents = [
             "organize_wardrobe", "outfit_suggestion", "weather_query", "general_help"
         ]
         self.model_file = "chatbot_model.pkl"
+        # Object providing organize_wardrobe, generate_outfit_suggestions and
+        # get_weather_forecast; resolved once instead of importing per call
+        self.actions = actions
+        self.scorer = None
+        self._cached_intent = lru_cache(maxsize=cache_size)(self._score_normalized)
         
         # Expanded training data for wardrobe-related intents
         self.training_data = {
@@ -62,6 +139,7 @@ class ChatbotModel:
         # Save the model
         with open(self.model_file, 'wb') as f:
             pickle.dump({'vectorizer': self.vectorizer, 'classifier': self.classifier}, f)
+        self.compile()
         print("Chatbot model trained and saved.")
 
     def load_model(self):
@@ -69,30 +147,62 @@ class ChatbotModel:
             data = pickle.load(f)
             self.vectorizer = data['vectorizer']
             self.classifier = data['classifier']
+        self.compile()
         print("Chatbot model loaded.")
 
-    def predict_intent(self, query):
+    def compile(self):
+        try:
+            self.scorer = CompiledIntentScorer(self.vectorizer, self.classifier)
+        except ValueError as e:
+            self.scorer = None
+            print(f"Using sklearn intent path: {e}")
+        self._cached_intent.cache_clear()
+
+    def predict_intent_sklearn(self, query):
         query_vectorized = self.vectorizer.transform([query.lower()])
         intent = self.classifier.predict(query_vectorized)[0]
         return intent
 
+    def _score_normalized(self, normalized):
+        if self.scorer is None:
+            return self.predict_intent_sklearn(normalized)
+        return str(self.scorer.predict(normalized))
+
+    @metrics.timed("chat_intent")
+    def predict_intent(self, query):
+        return self._cached_intent(normalize_query(query))
+
+    def predict_intents(self, queries):
+        normalized = [normalize_query(query) for query in queries]
+        if self.scorer is None:
+            return [self._cached_intent(query) for query in normalized]
+        unique = list(dict.fromkeys(normalized))
+        intents = dict(zip(unique, self.scorer.predict_batch(unique)))
+        return [str(intents[query]) for query in normalized]
+
+    def _actions(self):
+        if self.actions is None:
+            import app  # Only when used outside app.py; imported once to avoid a circular import
+            self.actions = app
+        return self.actions
+
+    @metrics.timed("chat_response")
     def generate_response(self, query, user_data):
         intent = self.predict_intent(query)
         query_lower = query.lower()
+        actions = self._actions()
 
         if intent == "organize_wardrobe":
-            from app import organize_wardrobe  # Import here to avoid circular import
-            org_result = organize_wardrobe(user_data["id"])
+            org_result = actions.organize_wardrobe(user_data["id"])
             return org_result["message"]
 
         elif intent == "outfit_suggestion":
-            from app import generate_outfit_suggestions  # Import here to avoid circular import
             occasions = {"work": "work", "formal": "formal", "casual": "casual", "athletic": "athletic"}
             detected_occasion = next((occ for key, occ in occasions.items() if key in query_lower), "casual")
             date_str = datetime.now().strftime('%Y-%m-%d')
             if "tomorrow" in query_lower:
                 date_str = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-            outfits = generate_outfit_suggestions(user_data["id"], detected_occasion, date_str, 1)
+            outfits = actions.generate_outfit_suggestions(user_data["id"], detected_occasion, date_str, 1)
             if outfits:
                 outfit = outfits[0]
                 items_list = ", ".join([f"{item['colors'][0]} {item['category']}" for item in outfit["items"]])
@@ -100,9 +210,8 @@ class ChatbotModel:
             return "I need more items in your wardrobe to suggest an outfit. Please upload some clothes!"
 
         elif intent == "weather_query":
-            from app import get_weather_forecast  # Import here to avoid circular import
             date_str = datetime.now().strftime('%Y-%m-%d') if "today" in query_lower or "now" in query_lower else (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-            weather = get_weather_forecast("user_location", date_str)
+            weather = actions.get_weather_forecast("user_location", date_str)
             return f"The weather on {date_str}: {weather['temp']}°F, {weather['conditions']}. {weather['recommendation']}"
 
         else:  # general_help
@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModel:
+    # Builds a model on first use (or in a background thread) instead of at
+    # import time. Callers that must not block use get(wait=False), which
+    # starts loading if needed and returns None until the model is ready.
+    NOT_LOADED = "not_loaded"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, name, loader, warmup=None):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.state = self.NOT_LOADED
+        self.error = None
+        self.load_seconds = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def ready(self):
+        return self.state == self.READY
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            model = self.loader()
+            if self.warmup is not None:
+                self.warmup(model)
+            self._model = model
+            self.load_seconds = time.perf_counter() - start
+            self.state = self.READY
+            logger.info(f"{self.name} loaded in {self.load_seconds:.1f}s")
+        except Exception as e:
+            self.error = str(e)
+            self.state = self.FAILED
+            logger.error(f"Error loading {self.name}: {e}")
+        finally:
+            self._done.set()
+
+    def _begin(self):
+        # Returns True if the caller should run the load itself
+        with self._lock:
+            if self.state != self.NOT_LOADED:
+                return False
+            self.state = self.LOADING
+            return True
+
+    def load_in_background(self):
+        if self._begin():
+            threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True).start()
+
+    def get(self, wait=True, timeout=None):
+        if self.state == self.READY:
+            return self._model
+        if not wait:
+            self.load_in_background()
+            return None
+        if self._begin():
+            self._load()
+        self._done.wait(timeout)
+        return self._model
+
+    def status(self):
+        return {"state": self.state, "error": self.error, "load_seconds": self.load_seconds}
@@ -0,0 +1,107 @@
+import hashlib
+import json
+from bisect import bisect_right
+
+# Closet sections in display order. An item goes to the first section whose
+# categories include its category and whose seasons overlap its seasons.
+SECTION_RULES = [
+    {"name": "Daily Wear", "categories": ["tops", "bottoms"], "seasons": ["spring", "summer"]},
+    {"name": "Seasonal", "categories": ["outerwear"], "seasons": ["fall", "winter"]},
+    {"name": "Special Occasion", "categories": ["dresses"], "seasons": ["all"]},
+    {"name": "Accessories", "categories": ["accessories", "shoes"], "seasons": ["all"]},
+]
+DEFAULT_SECTION = "Daily Wear"
+
+# Stored organization state built under different rules is rebuilt from scratch
+RULES_VERSION = hashlib.sha1(json.dumps([SECTION_RULES, DEFAULT_SECTION]).encode()).hexdigest()[:12]
+
+
+def place_item(item):
+    for rule in SECTION_RULES:
+        if item["category"] in rule["categories"]:
+            if "all" in rule["seasons"] or any(s in item["seasons"] for s in rule["seasons"]):
+                return rule["name"], f"{rule['name']} Section"
+    return DEFAULT_SECTION, f"{DEFAULT_SECTION} Section (default)"
+
+
+def section_entry(item, placement):
+    return {
+        "id": item["id"],
+        "name": item["name"],
+        "category": item["category"],
+        "color": item["colors"][0] if item["colors"] else "unknown",
+        "placement": placement
+    }
+
+
+def build_organization(wardrobe):
+    sections = {rule["name"]: [] for rule in SECTION_RULES}
+    for item in wardrobe:
+        section_name, placement = place_item(item)
+        sections[section_name].append(section_entry(item, placement))
+    return {
+        "closet_sections": [{"name": name, "items": items} for name, items in sections.items()],
+        "rules_version": RULES_VERSION,
+        # Wardrobe order of every placed item, so moved items land where a
+        # full rebuild would put them
+        "positions": {item["id"]: position for position, item in enumerate(wardrobe)},
+        "next_position": len(wardrobe)
+    }
+
+
+def is_current(organization):
+    return organization.get("rules_version") == RULES_VERSION and "positions" in organization
+
+
+def is_empty(organization):
+    return not any(section["items"] for section in organization["closet_sections"])
+
+
+def _find(organization, item_id):
+    for section in organization["closet_sections"]:
+        for index, entry in enumerate(section["items"]):
+            if entry["id"] == item_id:
+                return section, index
+    return None, None
+
+
+def remove_item(organization, item_id):
+    section, index = _find(organization, item_id)
+    organization["positions"].pop(item_id, None)
+    if section is None:
+        return False
+    del section["items"][index]
+    return True
+
+
+def place(organization, item):
+    # Add a new item or move an existing one to the section its current
+    # attributes call for; nothing else in the organization is touched
+    positions = organization["positions"]
+    if item["id"] not in positions:
+        positions[item["id"]] = organization["next_position"]
+        organization["next_position"] += 1
+    section_name, placement = place_item(item)
+    entry = section_entry(item, placement)
+
+    section, index = _find(organization, item["id"])
+    if section is not None:
+        if section["name"] == section_name:
+            section["items"][index] = entry
+            return
+        del section["items"][index]
+
+    target = next(s for s in organization["closet_sections"] if s["name"] == section_name)["items"]
+    keys = [positions.get(existing["id"], -1) for existing in target]
+    target.insert(bisect_right(keys, positions[item["id"]]), entry)
+
+
+def render(organization):
+    if is_empty(organization):
+        return {"message": "Wardrobe is empty", "sections": []}
+    organization_message = "I've organized your wardrobe! Here's where your clothes should go:\n"
+    for section in organization["closet_sections"]:
+        if section["items"]:
+            item_names = ", ".join([item["name"] for item in section["items"]])
+            organization_message += f"- {section['name']}: {item_names}\n"
+    return {"message": organization_message, "sections": organization["closet_sections"]}
@@ -0,0 +1,31 @@
+from cache import TTLCache
+
+
+class OutfitCache:
+    # Generated outfit suggestions keyed by (user_id, ...) plus an index of
+    # every cached outfit by (user_id, outfit_id), so a suggestion can be
+    # referred to by id after the response that produced it.
+    def __init__(self, maxsize=512, ttl=900):
+        self.suggestions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.outfits = TTLCache(maxsize=maxsize * 8, ttl=ttl)
+
+    def get_or_generate(self, key, generate):
+        user_id = key[0]
+
+        def load():
+            outfits = generate()
+            for outfit in outfits:
+                self.outfits.set((user_id, outfit["id"]), outfit)
+            return outfits
+
+        return self.suggestions.get_or_load(key, load)
+
+    def get_outfit(self, user_id, outfit_id):
+        return self.outfits.get((user_id, outfit_id))
+
+    def invalidate_user(self, user_id):
+        return (self.suggestions.discard_where(lambda key: key[0] == user_id) +
+                self.outfits.discard_where(lambda key: key[0] == user_id))
+
+    def stats(self):
+        return {"suggestions": self.suggestions.stats(), "outfits": self.outfits.stats()}
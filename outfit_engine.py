@@ -0,0 +1,209 @@
+import itertools
+from collections import OrderedDict
+
+import numpy as np
+
+SEASONS = ["spring", "summer", "fall", "winter"]
+OCCASIONS = ["casual", "work", "formal", "athletic"]
+OCCASION_CATEGORIES = {
+    "casual": ["tops", "bottoms", "shoes"],
+    "work": ["tops", "bottoms", "shoes"],
+    "formal": ["dresses", "shoes", "accessories"],
+    "athletic": ["tops", "bottoms", "shoes"]
+}
+DEFAULT_CATEGORIES = ["tops", "bottoms", "shoes"]
+
+COLORS = ["black", "white", "gray", "red", "green", "blue", "yellow", "orange", "purple", "pink", "other", "unknown"]
+NEUTRALS = {"black", "white", "gray", "other", "unknown"}
+# Pairs that work well together or clash; anything else scores DEFAULT_PAIR
+COLOR_PAIRS = {
+    ("blue", "yellow"): 0.8, ("blue", "orange"): 0.8, ("blue", "red"): 0.6, ("blue", "pink"): 0.7,
+    ("green", "purple"): 0.6, ("green", "yellow"): 0.6, ("purple", "yellow"): 0.7,
+    ("red", "pink"): 0.2, ("red", "orange"): 0.3, ("red", "green"): 0.3,
+    ("orange", "pink"): 0.3, ("orange", "purple"): 0.3, ("yellow", "pink"): 0.3,
+}
+DEFAULT_PAIR = 0.5
+SAME_COLOR = 0.7
+
+
+def color_compatibility():
+    size = len(COLORS)
+    matrix = np.full((size, size), DEFAULT_PAIR, dtype=np.float32)
+    for i, a in enumerate(COLORS):
+        for j, b in enumerate(COLORS):
+            if a in NEUTRALS or b in NEUTRALS:
+                matrix[i, j] = 1.0 if a != b or a in ("black", "white") else SAME_COLOR
+            elif a == b:
+                matrix[i, j] = SAME_COLOR
+            else:
+                matrix[i, j] = COLOR_PAIRS.get((a, b), COLOR_PAIRS.get((b, a), DEFAULT_PAIR))
+    return matrix
+
+
+COLOR_INDEX = {color: index for index, color in enumerate(COLORS)}
+SEASON_BITS = {season: 1 << index for index, season in enumerate(SEASONS)}
+OCCASION_BITS = {occasion: 1 << index for index, occasion in enumerate(OCCASIONS)}
+
+
+def _bitmask(values, bits):
+    mask = 0
+    for value in values:
+        mask |= bits.get(value, 0)
+    return mask
+
+
+class _Candidates:
+    # Column-oriented view of the items in one category. Items without a
+    # stored embedding (uploaded before the model was ready) get a zero row
+    # and has_embedding False, so they are left out of the coherence term.
+    def __init__(self, items, embedding_lookup=None):
+        self.items = items
+        other = COLOR_INDEX["other"]
+        self.colors = np.fromiter((COLOR_INDEX.get(item["colors"][0], other) if item["colors"] else other
+                                   for item in items), dtype=np.int64, count=len(items))
+        season_masks = np.fromiter((_bitmask(item["seasons"], SEASON_BITS) for item in items),
+                                   dtype=np.int64, count=len(items))
+        occasion_masks = np.fromiter((_bitmask(item["occasions"], OCCASION_BITS) for item in items),
+                                     dtype=np.int64, count=len(items))
+        self.seasons = (season_masks[:, None] >> np.arange(len(SEASONS))) & 1 == 1
+        self.occasions = (occasion_masks[:, None] >> np.arange(len(OCCASIONS))) & 1 == 1
+        self.embeddings = None
+        self.has_embedding = np.zeros(len(items), dtype=bool)
+        if embedding_lookup is not None and items:
+            vectors = [embedding_lookup(item["id"]) for item in items]
+            dim = next((len(v) for v in vectors if v is not None), 0)
+            if dim:
+                self.has_embedding = np.array([v is not None for v in vectors], dtype=bool)
+                self.embeddings = np.stack([
+                    np.asarray(v, dtype=np.float32) if v is not None else np.zeros(dim, dtype=np.float32)
+                    for v in vectors
+                ])
+
+    def subset(self, indices):
+        subset = object.__new__(_Candidates)
+        subset.items = [self.items[i] for i in indices]
+        subset.colors = self.colors[indices]
+        subset.seasons = self.seasons[indices]
+        subset.occasions = self.occasions[indices]
+        subset.embeddings = self.embeddings[indices] if self.embeddings is not None else None
+        subset.has_embedding = self.has_embedding[indices]
+        return subset
+
+
+class OutfitEngine:
+    # Scores whole outfits instead of picking items at random:
+    #   1. items are grouped into per-category arrays (cached per wardrobe version)
+    #   2. outfits are picked in rounds; each round shortlists the best
+    #      `shortlist` unused items per category by season/occasion fit
+    #   3. every combination of shortlisted items is scored at once with NumPy
+    #      broadcasting (colour compatibility, context fit, embedding coherence)
+    #   4. the best combination becomes an outfit and its items are retired, so
+    #      the result holds min(num_outfits, smallest category) outfits
+    # A seed makes the small tie-breaking jitter, and so the result, repeatable.
+    def __init__(self, shortlist=24, color_weight=0.35, context_weight=0.5, coherence_weight=0.15,
+                 jitter=0.02, max_cached=64):
+        self.shortlist = shortlist
+        self.color_weight = color_weight
+        self.context_weight = context_weight
+        self.coherence_weight = coherence_weight
+        self.jitter = jitter
+        self.max_cached = max_cached
+        self.compatibility = color_compatibility()
+        self._prepared = OrderedDict()
+
+    def prepare(self, items, categories, embedding_lookup=None, cache_key=None):
+        key = (cache_key, tuple(categories)) if cache_key is not None else None
+        if key is not None and key in self._prepared:
+            self._prepared.move_to_end(key)
+            return self._prepared[key]
+        members = {category: [] for category in categories}
+        for item in items:
+            group = members.get(item["category"])
+            if group is not None:
+                group.append(item)
+        prepared = {category: _Candidates(group, embedding_lookup) for category, group in members.items() if group}
+        if key is not None:
+            self._prepared[key] = prepared
+            while len(self._prepared) > self.max_cached:
+                self._prepared.popitem(last=False)
+        return prepared
+
+    def _context_scores(self, candidates, occasion, seasons):
+        season_vector = np.array([s in seasons for s in SEASONS], dtype=bool)
+        season_fit = (candidates.seasons & season_vector).any(axis=1)
+        if occasion in OCCASIONS:
+            occasion_fit = candidates.occasions[:, OCCASIONS.index(occasion)]
+        else:
+            occasion_fit = np.zeros(len(candidates.items), dtype=bool)
+        return 0.5 * season_fit + 0.5 * occasion_fit
+
+    def _combination_scores(self, groups, unary):
+        dims = len(groups)
+        shape = [len(group.items) for group in groups]
+
+        def along(values, axis):
+            view = [1] * dims
+            view[axis] = shape[axis]
+            return values.reshape(view)
+
+        context = sum(along(unary[axis], axis) for axis in range(dims)) / dims
+        if dims < 2:
+            return self.context_weight * context + self.color_weight
+
+        pairs = list(itertools.combinations(range(dims), 2))
+        color = 0
+        coherence = 0
+        coherent_pairs = 0
+        for a, b in pairs:
+            pair_shape = [1] * dims
+            pair_shape[a], pair_shape[b] = shape[a], shape[b]
+            compat = self.compatibility[np.ix_(groups[a].colors, groups[b].colors)]
+            color = color + compat.reshape(pair_shape)
+            if groups[a].embeddings is not None and groups[b].embeddings is not None:
+                # Pairs with a missing embedding contribute nothing and are
+                # not counted, instead of scoring as dissimilar
+                valid = np.outer(groups[a].has_embedding, groups[b].has_embedding)
+                similarity = np.where(valid, groups[a].embeddings @ groups[b].embeddings.T, 0)
+                coherence = coherence + similarity.reshape(pair_shape)
+                coherent_pairs = coherent_pairs + valid.reshape(pair_shape)
+        score = self.color_weight * color / len(pairs) + self.context_weight * context
+        if np.any(coherent_pairs):
+            # Outfits without a single embedded pair get the average coherence,
+            # so they rank neither above nor below the rest on that term
+            counts = np.broadcast_to(coherent_pairs, np.shape(score))
+            mean = np.sum(np.broadcast_to(coherence, np.shape(score))) / np.sum(counts)
+            coherence = np.where(counts > 0, coherence / np.maximum(counts, 1), mean)
+            score = score + self.coherence_weight * coherence
+        return score
+
+    def suggest(self, prepared, categories, occasion, seasons, num_outfits=3, seed=0):
+        rng = np.random.default_rng(seed)
+        present = [category for category in categories if category in prepared]
+        if not present or num_outfits <= 0:
+            return []
+        coverage = len(present) / len(categories)
+
+        candidates = [prepared[category] for category in present]
+        scores = [self._context_scores(group, occasion, seasons) + rng.uniform(0, self.jitter, size=len(group.items))
+                  for group in candidates]
+        available = [np.ones(len(group.items), dtype=bool) for group in candidates]
+
+        outfits = []
+        for _ in range(min(num_outfits, min(len(group.items) for group in candidates))):
+            groups, unary = [], []
+            for group, group_scores, free in zip(candidates, scores, available):
+                indices = np.flatnonzero(free)
+                if len(indices) > self.shortlist:
+                    keep = np.argpartition(-group_scores[indices], self.shortlist - 1)[:self.shortlist]
+                    indices = indices[keep]
+                groups.append((group.subset(indices), indices))
+                unary.append(group_scores[indices])
+
+            combos = self._combination_scores([subset for subset, _ in groups], unary) * coverage
+            positions = np.unravel_index(int(np.argmax(combos)), np.shape(combos))
+            items = []
+            for (subset, indices), free, position in zip(groups, available, positions):
+                free[indices[position]] = False
+                items.append(subset.items[position])
+            outfits.append((round(float(combos[positions]), 4), items))
+        return outfits
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import threading
+
+import cv2
+
+from image_pipeline import ImagePipeline
+
+# Longest side in pixels of each named rendition
+RENDITION_SIZES = {"thumb": 160, "small": 320, "medium": 640, "large": 1280}
+FORMATS = {"webp": ("image/webp", ".webp", cv2.IMWRITE_WEBP_QUALITY),
+           "jpeg": ("image/jpeg", ".jpg", cv2.IMWRITE_JPEG_QUALITY)}
+# Bump when the way renditions are produced changes, so cached copies and
+# ETags from the old version are not reused
+RENDITION_VERSION = 1
+
+
+class RenditionStore:
+    # Downscaled copies of uploads in <folder>/.renditions, produced on first
+    # request (or ahead of time with generate) and kept until the upload is
+    # deleted. Upload file names are unique and their content never changes,
+    # so a rendition is identified, and its ETag derived, from the name alone.
+    def __init__(self, folder, quality=80):
+        self.folder = folder
+        self.rendition_folder = os.path.join(folder, ".renditions")
+        self.quality = quality
+        os.makedirs(self.rendition_folder, exist_ok=True)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self.generated = 0
+
+    def path(self, filename, size, fmt):
+        return os.path.join(self.rendition_folder, f"{filename}.{size}.v{RENDITION_VERSION}{FORMATS[fmt][1]}")
+
+    @staticmethod
+    def etag(filename, size=None, fmt=None):
+        key = f"{filename}:{size}:{fmt}:{RENDITION_VERSION if size else ''}"
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _lock_for(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, filename, size, fmt):
+        # Returns the rendition's path, generating it if needed, or None if
+        # the original is missing or can't be decoded
+        target = self.path(filename, size, fmt)
+        if os.path.exists(target):
+            return target
+        key = (filename, size, fmt)
+        lock = self._lock_for(key)
+        try:
+            with lock:
+                if not os.path.exists(target) and not self._render(filename, size, fmt, target):
+                    return None
+                return target
+        finally:
+            with self._locks_lock:
+                self._locks.pop(key, None)
+
+    def _render(self, filename, size, fmt, target):
+        source = os.path.join(self.folder, filename)
+        try:
+            with open(source, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        longest = RENDITION_SIZES[size]
+        rgb = ImagePipeline(model_size=longest).decode(data)
+        if rgb is None:
+            return False
+        height, width = rgb.shape[:2]
+        scale = longest / max(height, width)
+        if scale < 1:
+            rgb = cv2.resize(rgb, (max(1, round(width * scale)), max(1, round(height * scale))),
+                             interpolation=cv2.INTER_AREA)
+        _, extension, quality_flag = FORMATS[fmt]
+        ok, encoded = cv2.imencode(extension, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [quality_flag, self.quality])
+        if not ok:
+            return False
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded.tobytes())
+        os.replace(tmp_path, target)
+        self.generated += 1
+        return True
+
+    def generate(self, filename, sizes, fmt="webp"):
+        for size in sizes:
+            self.get(filename, size, fmt)
+
+    def remove(self, filename):
+        prefix = f"{filename}."
+        for entry in os.scandir(self.rendition_folder):
+            if entry.name.startswith(prefix):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
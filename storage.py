@@ -0,0 +1,564 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+
+from chat_log import ChatLog
+from file_lock import locked
+
+logger = logging.getLogger(__name__)
+
+
+def default_user(user_id):
+    return {
+        "id": user_id,
+        "wardrobe": [],
+        "outfits": [],
+        "preferences": {"style_preferences": [], "color_preferences": [], "favorite_occasions": []},
+        "chatbot_history": [],
+        "organization": {"closet_sections": [], "last_organized": None}
+    }
+
+
+class Storage(ABC):
+    # Interface shared by the storage backends. Whole-document access
+    # (load_user/save_user) is kept for compatibility; request handlers
+    # should prefer the row-level methods.
+    @abstractmethod
+    def load_user(self, user_id):
+        pass
+
+    @abstractmethod
+    def save_user(self, user_id, data):
+        pass
+
+    @abstractmethod
+    def list_users(self):
+        pass
+
+    @abstractmethod
+    def list_items(self, user_id):
+        pass
+
+    @abstractmethod
+    def list_items_keyed(self, user_id):
+        # Returns (wardrobe_version, [(order key, item), ...]) from one read.
+        # Order keys never change or get reused, so they can be page cursors.
+        pass
+
+    @abstractmethod
+    def wardrobe_version(self, user_id):
+        # Persisted counter bumped by every wardrobe write, from any process
+        pass
+
+    @abstractmethod
+    def get_item(self, user_id, item_id):
+        pass
+
+    @abstractmethod
+    def add_item(self, user_id, item):
+        pass
+
+    @abstractmethod
+    def update_item(self, user_id, item_id, fields):
+        pass
+
+    @abstractmethod
+    def delete_item(self, user_id, item_id):
+        pass
+
+    @abstractmethod
+    def list_outfits(self, user_id):
+        pass
+
+    @abstractmethod
+    def add_outfit(self, user_id, outfit):
+        pass
+
+    @abstractmethod
+    def append_chat(self, user_id, entries, limit=None):
+        pass
+
+    @abstractmethod
+    def chat_history(self, user_id, before=None, limit=50):
+        # Returns (messages oldest first, `before` for the previous page or None)
+        pass
+
+    @abstractmethod
+    def update_organization(self, user_id, fn):
+        # Atomic read-modify-write: fn mutates the organization in place
+        pass
+
+
+class JSONStorage(Storage):
+    # One JSON document per user. Every operation still reads and rewrites the
+    # whole file, but under a per-user thread and file lock and with an atomic
+    # replace, so concurrent requests and worker processes don't lose writes.
+    # The document also holds the wardrobe version and a stable order key per
+    # item (wardrobe_seq), assigned in document order for older files. Chat history
+    # is kept out of the document in an append-only ChatLog; history found in
+    # an older document is moved there on first use.
+    def __init__(self, root, chat_root=None):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.chat_log = ChatLog(chat_root or os.path.join(os.path.dirname(os.path.abspath(root)), 'chat'))
+        self._chat_migrated = set()
+        self._locks = defaultdict(threading.RLock)
+        self._locks_guard = threading.Lock()
+
+    def _path(self, user_id):
+        return os.path.join(self.root, f"{user_id}.json")
+
+    def _lock(self, user_id):
+        with self._locks_guard:
+            return self._locks[user_id]
+
+    @contextmanager
+    def _write_lock(self, user_id):
+        with self._lock(user_id), locked(f"{self._path(user_id)}.lock"):
+            yield
+
+    def _load_document(self, user_id):
+        path = self._path(user_id)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return default_user(user_id)
+
+    def _save_document(self, user_id, data):
+        path = self._path(user_id)
+        tmp_path = f"{path}.tmp"
+        with self._lock(user_id):
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+            # Written after the document: a reader never sees a version newer
+            # than the wardrobe it then loads
+            with open(tmp_path, 'w') as f:
+                f.write(str(data.get("wardrobe_version", 0)))
+            os.replace(tmp_path, f"{path}.version")
+
+    def _migrate_chat(self, user_id):
+        if user_id in self._chat_migrated:
+            return
+        with self._write_lock(user_id):
+            if user_id not in self._chat_migrated:
+                data = self._load_document(user_id)
+                if data.get("chatbot_history"):
+                    if not self.chat_log.exists(user_id):
+                        self.chat_log.append(user_id, data["chatbot_history"])
+                    data["chatbot_history"] = []
+                    self._save_document(user_id, data)
+                self._chat_migrated.add(user_id)
+
+    def load_user(self, user_id):
+        self._migrate_chat(user_id)
+        data = self._load_document(user_id)
+        data["chatbot_history"] = self.chat_log.all(user_id)
+        return data
+
+    def save_user(self, user_id, data):
+        with self._write_lock(user_id):
+            self._chat_migrated.add(user_id)
+            self.chat_log.replace(user_id, data.get("chatbot_history", []))
+            # Items that survive the rewrite keep their order keys
+            current = self._load_document(user_id)
+            current_keys = self._item_keys(current)
+            document = {**data, "chatbot_history": [], "wardrobe_version": current.get("wardrobe_version", 0) + 1,
+                        "next_item_seq": current["next_item_seq"]}
+            ids = {item["id"] for item in document.get("wardrobe", [])}
+            document["wardrobe_seq"] = {item_id: key for item_id, key in current_keys.items() if item_id in ids}
+            self._item_keys(document)
+            self._save_document(user_id, document)
+
+    def list_users(self):
+        return sorted(name[:-5] for name in os.listdir(self.root) if name.endswith('.json'))
+
+    def _modify(self, user_id, fn, wardrobe=False):
+        with self._write_lock(user_id):
+            data = self._load_document(user_id)
+            result = fn(data)
+            if wardrobe:
+                data["wardrobe_version"] = data.get("wardrobe_version", 0) + 1
+            self._save_document(user_id, data)
+            return result
+
+    @staticmethod
+    def _item_keys(data):
+        # Items without a key (documents written before keys existed) get the
+        # next ones in document order; the same document always yields the
+        # same keys, and any later write persists them
+        keys = data.setdefault("wardrobe_seq", {})
+        next_seq = data.get("next_item_seq", 0)
+        for item in data["wardrobe"]:
+            if item["id"] not in keys:
+                keys[item["id"]] = next_seq
+                next_seq += 1
+        data["next_item_seq"] = max([next_seq, *(key + 1 for key in keys.values())])
+        return keys
+
+    def list_items(self, user_id):
+        return self._load_document(user_id)["wardrobe"]
+
+    def list_items_keyed(self, user_id):
+        data = self._load_document(user_id)
+        keys = self._item_keys(data)
+        return data.get("wardrobe_version", 0), [(keys[item["id"]], item) for item in data["wardrobe"]]
+
+    def wardrobe_version(self, user_id):
+        # Mirrored into a few-byte file after each document write, so checking
+        # it doesn't parse the whole document
+        try:
+            with open(f"{self._path(user_id)}.version") as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return self._load_document(user_id).get("wardrobe_version", 0)
+
+    def get_item(self, user_id, item_id):
+        return next((item for item in self.list_items(user_id) if item["id"] == item_id), None)
+
+    def add_item(self, user_id, item):
+        def apply(data):
+            keys = self._item_keys(data)
+            data["wardrobe"].append(item)
+            keys[item["id"]] = data["next_item_seq"]
+            data["next_item_seq"] += 1
+        self._modify(user_id, apply, wardrobe=True)
+        return item
+
+    def update_item(self, user_id, item_id, fields):
+        def apply(data):
+            item = next((item for item in data["wardrobe"] if item["id"] == item_id), None)
+            if item is not None:
+                item.update(fields)
+            return item
+        return self._modify(user_id, apply, wardrobe=True)
+
+    def delete_item(self, user_id, item_id):
+        def apply(data):
+            self._item_keys(data)
+            index = next((i for i, item in enumerate(data["wardrobe"]) if item["id"] == item_id), None)
+            if index is None:
+                return None
+            data["wardrobe_seq"].pop(item_id, None)
+            return data["wardrobe"].pop(index)
+        return self._modify(user_id, apply, wardrobe=True)
+
+    def list_outfits(self, user_id):
+        return self._load_document(user_id)["outfits"]
+
+    def add_outfit(self, user_id, outfit):
+        self._modify(user_id, lambda data: data["outfits"].append(outfit))
+        return outfit
+
+    def append_chat(self, user_id, entries, limit=None):
+        self._migrate_chat(user_id)
+        self.chat_log.append(user_id, entries, limit)
+
+    def chat_history(self, user_id, before=None, limit=50):
+        self._migrate_chat(user_id)
+        return self.chat_log.history(user_id, before, limit)
+
+    def update_organization(self, user_id, fn):
+        def apply(data):
+            fn(data["organization"])
+            return data["organization"]
+        return self._modify(user_id, apply)
+
+
+class SQLiteStorage(Storage):
+    # Row-per-record storage in a single SQLite database running in WAL mode.
+    # Wardrobe items, outfits and chat messages are separate rows, so a chat
+    # message or an item edit touches only the rows involved.
+    schema = """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            preferences TEXT NOT NULL,
+            organization TEXT NOT NULL,
+            wardrobe_version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS wardrobe_items (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            UNIQUE (user_id, item_id)
+        );
+        CREATE TABLE IF NOT EXISTS outfits (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            outfit_id TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS outfits_user ON outfits (user_id, seq);
+        CREATE TABLE IF NOT EXISTS chat_history (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            sender TEXT NOT NULL,
+            message TEXT NOT NULL,
+            timestamp TEXT
+        );
+        CREATE INDEX IF NOT EXISTS chat_history_user ON chat_history (user_id, seq);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(self.schema)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        if "wardrobe_version" not in columns:
+            conn.execute("ALTER TABLE users ADD COLUMN wardrobe_version INTEGER NOT NULL DEFAULT 0")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def _ensure_user(self, conn, user_id):
+        defaults = default_user(user_id)
+        conn.execute(
+            "INSERT OR IGNORE INTO users (id, preferences, organization) VALUES (?, ?, ?)",
+            (user_id, json.dumps(defaults["preferences"]), json.dumps(defaults["organization"]))
+        )
+
+    def _wardrobe_changed(self, conn, user_id):
+        self._ensure_user(conn, user_id)
+        conn.execute("UPDATE users SET wardrobe_version = wardrobe_version + 1 WHERE id = ?", (user_id,))
+
+    def load_user(self, user_id):
+        conn = self._connection()
+        row = conn.execute("SELECT preferences, organization FROM users WHERE id = ?", (user_id,)).fetchone()
+        data = default_user(user_id)
+        if row is not None:
+            data["preferences"] = json.loads(row[0])
+            data["organization"] = json.loads(row[1])
+        data["wardrobe"] = self.list_items(user_id)
+        data["outfits"] = self.list_outfits(user_id)
+        data["chatbot_history"] = [
+            {"sender": sender, "message": message, "timestamp": timestamp, "seq": seq}
+            for seq, sender, message, timestamp in conn.execute(
+                "SELECT seq, sender, message, timestamp FROM chat_history WHERE user_id = ? ORDER BY seq", (user_id,)
+            )
+        ]
+        return data
+
+    def save_user(self, user_id, data):
+        defaults = default_user(user_id)
+        with self._transaction() as conn:
+            self._ensure_user(conn, user_id)
+            conn.execute(
+                "UPDATE users SET preferences = ?, organization = ?, wardrobe_version = wardrobe_version + 1 "
+                "WHERE id = ?",
+                (json.dumps(data.get("preferences", defaults["preferences"])),
+                 json.dumps(data.get("organization", defaults["organization"])), user_id)
+            )
+            # Items that survive the rewrite keep their seq (their page cursor)
+            items = data.get("wardrobe", [])
+            kept = {item["id"] for item in items}
+            stored = [row[0] for row in conn.execute("SELECT item_id FROM wardrobe_items WHERE user_id = ?", (user_id,))]
+            conn.executemany(
+                "DELETE FROM wardrobe_items WHERE user_id = ? AND item_id = ?",
+                [(user_id, item_id) for item_id in stored if item_id not in kept]
+            )
+            conn.executemany(
+                "INSERT INTO wardrobe_items (user_id, item_id, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, item_id) DO UPDATE SET data = excluded.data",
+                [(user_id, item["id"], json.dumps(item)) for item in items]
+            )
+            conn.execute("DELETE FROM outfits WHERE user_id = ?", (user_id,))
+            conn.executemany(
+                "INSERT INTO outfits (user_id, outfit_id, data) VALUES (?, ?, ?)",
+                [(user_id, outfit["id"], json.dumps(outfit)) for outfit in data.get("outfits", [])]
+            )
+            conn.execute("DELETE FROM chat_history WHERE user_id = ?", (user_id,))
+            conn.executemany(
+                "INSERT INTO chat_history (user_id, sender, message, timestamp) VALUES (?, ?, ?, ?)",
+                [(user_id, entry["sender"], entry["message"], entry.get("timestamp"))
+                 for entry in data.get("chatbot_history", [])]
+            )
+
+    def list_users(self):
+        return [row[0] for row in self._connection().execute("SELECT id FROM users ORDER BY id")]
+
+    def list_items(self, user_id):
+        return [
+            json.loads(row[0]) for row in self._connection().execute(
+                "SELECT data FROM wardrobe_items WHERE user_id = ? ORDER BY seq", (user_id,)
+            )
+        ]
+
+    def list_items_keyed(self, user_id):
+        conn = self._connection()
+        # One read transaction, so the version matches the rows
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT wardrobe_version FROM users WHERE id = ?", (user_id,)).fetchone()
+            items = [
+                (seq, json.loads(data)) for seq, data in conn.execute(
+                    "SELECT seq, data FROM wardrobe_items WHERE user_id = ? ORDER BY seq", (user_id,)
+                )
+            ]
+        finally:
+            conn.execute("COMMIT")
+        return row[0] if row else 0, items
+
+    def wardrobe_version(self, user_id):
+        row = self._connection().execute("SELECT wardrobe_version FROM users WHERE id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get_item(self, user_id, item_id):
+        row = self._connection().execute(
+            "SELECT data FROM wardrobe_items WHERE user_id = ? AND item_id = ?", (user_id, item_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_item(self, user_id, item):
+        with self._transaction() as conn:
+            self._wardrobe_changed(conn, user_id)
+            conn.execute(
+                "INSERT INTO wardrobe_items (user_id, item_id, data) VALUES (?, ?, ?)",
+                (user_id, item["id"], json.dumps(item))
+            )
+        return item
+
+    def update_item(self, user_id, item_id, fields):
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM wardrobe_items WHERE user_id = ? AND item_id = ?", (user_id, item_id)
+            ).fetchone()
+            if row is None:
+                return None
+            item = json.loads(row[0])
+            item.update(fields)
+            conn.execute(
+                "UPDATE wardrobe_items SET data = ? WHERE user_id = ? AND item_id = ?",
+                (json.dumps(item), user_id, item_id)
+            )
+            self._wardrobe_changed(conn, user_id)
+        return item
+
+    def delete_item(self, user_id, item_id):
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM wardrobe_items WHERE user_id = ? AND item_id = ?", (user_id, item_id)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM wardrobe_items WHERE user_id = ? AND item_id = ?", (user_id, item_id))
+            self._wardrobe_changed(conn, user_id)
+        return json.loads(row[0])
+
+    def list_outfits(self, user_id):
+        return [
+            json.loads(row[0]) for row in self._connection().execute(
+                "SELECT data FROM outfits WHERE user_id = ? ORDER BY seq", (user_id,)
+            )
+        ]
+
+    def add_outfit(self, user_id, outfit):
+        with self._transaction() as conn:
+            self._ensure_user(conn, user_id)
+            conn.execute(
+                "INSERT INTO outfits (user_id, outfit_id, data) VALUES (?, ?, ?)",
+                (user_id, outfit["id"], json.dumps(outfit))
+            )
+        return outfit
+
+    def append_chat(self, user_id, entries, limit=None):
+        with self._transaction() as conn:
+            self._ensure_user(conn, user_id)
+            conn.executemany(
+                "INSERT INTO chat_history (user_id, sender, message, timestamp) VALUES (?, ?, ?, ?)",
+                [(user_id, entry["sender"], entry["message"], entry.get("timestamp")) for entry in entries]
+            )
+            if limit is not None:
+                conn.execute(
+                    "DELETE FROM chat_history WHERE user_id = ? AND seq <= ("
+                    "SELECT seq FROM chat_history WHERE user_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                    (user_id, user_id, limit)
+                )
+
+    def chat_history(self, user_id, before=None, limit=50):
+        rows = self._connection().execute(
+            "SELECT seq, sender, message, timestamp FROM chat_history WHERE user_id = ? AND seq < ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (user_id, before if before is not None else 2 ** 63 - 1, limit + 1)
+        ).fetchall()
+        page = [
+            {"sender": sender, "message": message, "timestamp": timestamp, "seq": seq}
+            for seq, sender, message, timestamp in reversed(rows[:limit])
+        ]
+        return page, page[0]["seq"] if len(rows) > limit and page else None
+
+    def update_organization(self, user_id, fn):
+        with self._transaction() as conn:
+            self._ensure_user(conn, user_id)
+            row = conn.execute("SELECT organization FROM users WHERE id = ?", (user_id,)).fetchone()
+            organization = json.loads(row[0])
+            fn(organization)
+            conn.execute("UPDATE users SET organization = ? WHERE id = ?", (json.dumps(organization), user_id))
+        return organization
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write
+    # sequences inside the block cannot interleave with another writer.
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def create_storage(backend, database_path):
+    if backend == 'json':
+        return JSONStorage(os.path.join(database_path, 'users'), os.path.join(database_path, 'chat'))
+    if backend == 'sqlite':
+        return SQLiteStorage(os.path.join(database_path, 'wardrobe.db'))
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def migrate_json_to_sqlite(database_path, overwrite=False):
+    source = create_storage('json', database_path)
+    target = create_storage('sqlite', database_path)
+    existing = set(target.list_users())
+    migrated = []
+    for user_id in source.list_users():
+        if user_id in existing and not overwrite:
+            logger.info(f"Skipping {user_id}: already present in SQLite")
+            continue
+        target.save_user(user_id, source.load_user(user_id))
+        migrated.append(user_id)
+    logger.info(f"Migrated {len(migrated)} users to {target.path}")
+    return migrated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Copy JSON user documents into the SQLite backend")
+    parser.add_argument("--database", default="database")
+    parser.add_argument("--overwrite", action="store_true", help="replace users that already exist in SQLite")
+    args = parser.parse_args()
+    migrate_json_to_sqlite(args.database, args.overwrite)
@@ -0,0 +1,159 @@
+import threading
+from collections import OrderedDict, defaultdict
+
+# Filterable item attributes and whether they hold one value or a list
+INDEXED_FIELDS = {"category": False, "colors": True, "seasons": True, "occasions": True}
+
+
+class UserWardrobe:
+    # In-memory copy of one user's wardrobe at one storage version, with a
+    # set of item ids per (field, value). Items are ordered by the key storage
+    # gave them, which never changes and doubles as the pagination cursor.
+    def __init__(self, keyed_items=(), version=0):
+        self.items = {}
+        self.seq = {}
+        self.version = version
+        self.postings = {field: defaultdict(set) for field in INDEXED_FIELDS}
+        for key, item in keyed_items:
+            self.seq[item["id"]] = key
+            self.put(item)
+
+    def _values(self, item, field):
+        value = item.get(field)
+        if value is None:
+            return []
+        return value if INDEXED_FIELDS[field] else [value]
+
+    def _unindex(self, item):
+        for field in INDEXED_FIELDS:
+            for value in self._values(item, field):
+                ids = self.postings[field].get(value)
+                if ids is not None:
+                    ids.discard(item["id"])
+                    if not ids:
+                        del self.postings[field][value]
+
+    def put(self, item):
+        # Only for items that already have a key
+        old = self.items.get(item["id"])
+        if old is not None:
+            self._unindex(old)
+        self.items[item["id"]] = item
+        for field in INDEXED_FIELDS:
+            for value in self._values(item, field):
+                self.postings[field][value].add(item["id"])
+
+    def remove(self, item_id):
+        item = self.items.pop(item_id, None)
+        if item is not None:
+            self._unindex(item)
+            del self.seq[item_id]
+        return item
+
+    def query(self, filters):
+        # filters maps an indexed field to one required value
+        if not filters:
+            return self.ordered()
+        postings = [self.postings[field].get(value, set()) for field, value in filters.items()]
+        postings.sort(key=len)
+        matched = set(postings[0]).intersection(*postings[1:])
+        return sorted(matched, key=self.seq.__getitem__)
+
+    def ordered(self):
+        return sorted(self.items, key=self.seq.__getitem__)
+
+    def page(self, item_ids, limit=None, cursor=None):
+        # Returns (items, next_cursor); cursor is the seq of the last item seen
+        if cursor is not None:
+            item_ids = [item_id for item_id in item_ids if self.seq[item_id] > cursor]
+        if limit is None or len(item_ids) <= limit:
+            return [self.items[item_id] for item_id in item_ids], None
+        page = item_ids[:limit]
+        return [self.items[item_id] for item_id in page], self.seq[page[-1]]
+
+
+class WardrobeIndex:
+    # Lazily built UserWardrobe per user. Storage keeps a per-user wardrobe
+    # version that every write bumps, whichever process makes it; each read
+    # compares it with the cached copy's and reloads on a mismatch, so writes
+    # from other workers show up on the next request. Writes made through this
+    # index are applied in place when nothing else changed in between.
+    # Reloads, queries and in-place changes hold only that user's lock; the
+    # shared lock guards the LRU and is never held across a load.
+    def __init__(self, loader, version_fn, max_users=256):
+        self.loader = loader  # user_id -> (version, [(order key, item), ...])
+        self.version_fn = version_fn
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._user_locks = defaultdict(threading.RLock)
+        self._lock = threading.Lock()
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            return self._user_locks[user_id]
+
+    def get(self, user_id):
+        version = self.version_fn(user_id)
+        with self._user_lock(user_id):
+            with self._lock:
+                wardrobe = self._users.get(user_id)
+                if wardrobe is not None and wardrobe.version == version:
+                    self._users.move_to_end(user_id)
+                    return wardrobe
+            loaded_version, keyed_items = self.loader(user_id)
+            wardrobe = UserWardrobe(keyed_items, loaded_version)
+            with self._lock:
+                self._users[user_id] = wardrobe
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            return wardrobe
+
+    def query(self, user_id, filters, limit=None, cursor=None):
+        with self._user_lock(user_id):
+            wardrobe = self.get(user_id)
+            item_ids = wardrobe.query(filters)
+            items, next_cursor = wardrobe.page(item_ids, limit, cursor)
+            return {"items": items, "total": len(wardrobe.items), "matched": len(item_ids), "next_cursor": next_cursor}
+
+    def items(self, user_id):
+        with self._user_lock(user_id):
+            wardrobe = self.get(user_id)
+            return [wardrobe.items[item_id] for item_id in wardrobe.ordered()]
+
+    def version(self, user_id):
+        return str(self.version_fn(user_id))
+
+    def _apply(self, user_id, change):
+        # Called after a single write went to storage: if the cached copy is
+        # exactly one version behind, that write is the only change
+        version = self.version_fn(user_id)
+        with self._user_lock(user_id):
+            with self._lock:
+                wardrobe = self._users.get(user_id)
+            if wardrobe is None:
+                return
+            if wardrobe.version + 1 == version and change(wardrobe):
+                wardrobe.version = version
+            else:
+                with self._lock:
+                    if self._users.get(user_id) is wardrobe:
+                        del self._users[user_id]
+
+    def put(self, user_id, item):
+        # A new item needs the order key storage gave it, so it is reloaded
+        def change(wardrobe):
+            if item["id"] not in wardrobe.items:
+                return False
+            wardrobe.put(item)
+            return True
+        self._apply(user_id, change)
+
+    def remove(self, user_id, item_id):
+        def change(wardrobe):
+            wardrobe.remove(item_id)
+            return True
+        self._apply(user_id, change)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
@@ -0,0 +1,67 @@
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherError(Exception):
+    pass
+
+
+class WeatherClient:
+    # Forecast lookups keyed by (location, date). Responses are cached with a
+    # TTL, concurrent misses for the same key share one HTTP call, and the
+    # last known forecast is served if the API fails after it expired. When
+    # there is none, the fallback forecast is served. Either way the failure
+    # is cached for error_ttl seconds, so an unreachable API costs one timeout
+    # per key per error_ttl instead of one per request.
+    def __init__(self, api_key, base_url="http://api.weatherapi.com/v1", timeout=(3.05, 5),
+                 ttl=1800, maxsize=256, pool_size=10, fallback=None, error_ttl=60):
+        self.api_key = api_key
+        self.fallback = fallback
+        self.error_ttl = error_ttl
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, location, date_str):
+        response = self.session.get(
+            f"{self.base_url}/forecast.json",
+            params={"key": self.api_key, "q": location, "dt": date_str},
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise WeatherError(f"Weather API error: {response.status_code}")
+        forecast = response.json()['forecast']['forecastday'][0]['day']
+        return {
+            "temp": forecast['avgtemp_f'],
+            "conditions": forecast['condition']['text'].lower(),
+            "recommendation": "Adjust based on weather conditions."
+        }
+
+    def _load(self, location, date_str):
+        try:
+            return self.fetch(location, date_str)
+        except Exception as e:
+            logger.error(f"Error getting weather forecast: {e}")
+            raise
+
+    def forecast(self, location, date_str):
+        if self.fallback is None:
+            return dict(self.cache.get_or_load((location, date_str), lambda: self._load(location, date_str)))
+        return dict(self.cache.get_or_load((location, date_str), lambda: self._load(location, date_str),
+                                           fallback=self.fallback, error_ttl=self.error_ttl))
+
+    def stats(self):
+        return self.cache.stats()
+
+    def close(self):
+        self.session.close()